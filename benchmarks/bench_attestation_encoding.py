@@ -0,0 +1,134 @@
+"""
+Кодирование calldata attest: старый путь (типы по значениям, два eth_abi.encode, hex и обратно)
+против скомпилированных энкодеров схем и пачки через encode_many.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_attestation_encoding
+"""
+import random
+import time
+
+from eth_abi import encode
+from hexbytes import HexBytes
+
+from utils.chain_context import get_chain_context
+from utils.schema_encoder import compile_schema, encode_recipient
+from utils.sign import attest_calldata, attest_calldata_many, attestation_tuple
+
+ATTESTATIONS = 5000
+SCHEMAS = 20
+ADDRESS = "0x000000000000000000000000000000000000dEaD"
+
+
+def legacy_values(fields):
+    # Как было: bytes-поле заполнялось строкой "0x" и кодировалось как string
+    values = []
+    for field in fields:
+        field_type = field["type"].lower()
+        values.append({"string": "word", "bool": True, "bytes": "0x", "uint256": 0}[field_type])
+    return tuple(values)
+
+
+def legacy_infer(value):
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "uint256"
+    return "bytes"
+
+
+def legacy_data(fields, recipient):
+    values = legacy_values(fields)
+    data = "0x" + encode([legacy_infer(value) for value in values], values).hex()
+    recipient_hex = "0x" + encode(["string"], [recipient]).hex()
+    return HexBytes(recipient_hex), HexBytes(data)
+
+
+def compiled_data(fake, fields, recipient):
+    encoder = compile_schema(fields)
+    return encode_recipient(recipient), encoder.encode(encoder.values(fake))
+
+
+def legacy_calldata(ctx, schema_id, fields, recipient):
+    recipient_bytes, data = legacy_data(fields, recipient)
+    return ctx.attest(attestation_tuple(schema_id, ADDRESS, recipient_bytes, data), ADDRESS, b'', b'')
+
+
+def timed(func, *args, repeat=5):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class FixedFake:
+    """Детерминированный faker: сравниваем только кодирование, а не генерацию слов"""
+    def word(self):
+        return "word"
+
+
+def random_schema(index):
+    types = ["string", "bool", "uint256"] + (["bytes"] if index % 2 else [])
+    fields = [{"name": f"f{n}", "type": random.choice(types)} for n in range(random.randint(1, 5))]
+    return hex(index + 1), fields
+
+
+def main():
+    random.seed(1)
+    ctx = get_chain_context("opbnb")
+    schemas = [random_schema(index) for index in range(SCHEMAS)]
+    jobs = [(ADDRESS, *random.choice(schemas), ADDRESS) for _ in range(ATTESTATIONS)]
+
+    # Без bytes-полей новый энкодер даёт ровно те же байты, что и старый путь
+    for _, _, fields, recipient in jobs[:200]:
+        encoder = compile_schema(fields)
+        if "bytes" not in encoder.types:
+            values = legacy_values(fields)
+            assert encoder.encode(values) == encode([legacy_infer(value) for value in values], values)
+        assert encode_recipient(recipient) == encode(["string"], [recipient])
+
+    fake = FixedFake()
+
+    def data_legacy():
+        for _, _, fields, recipient in jobs:
+            legacy_data(fields, recipient)
+
+    def data_compiled():
+        for _, _, fields, recipient in jobs:
+            compiled_data(fake, fields, recipient)
+
+    def data_many():
+        groups = {}
+        for _, _, fields, _ in jobs:
+            groups.setdefault(compile_schema(fields), []).append(None)
+        for encoder, rows in groups.items():
+            encoder.encode_many([encoder.values(fake) for _ in rows])
+        [encode_recipient(recipient) for _, _, _, recipient in jobs]
+
+    def calldata_legacy():
+        for _, schema_id, fields, recipient in jobs:
+            legacy_calldata(ctx, schema_id, fields, recipient)
+
+    def calldata_compiled():
+        for address, schema_id, fields, recipient in jobs:
+            attest_calldata(ctx, fake, address, schema_id, fields, recipient)
+
+    results = [
+        ("data: старый путь", timed(data_legacy)),
+        ("data: компилированный", timed(data_compiled)),
+        ("data: encode_many", timed(data_many)),
+        ("calldata: старый путь", timed(calldata_legacy)),
+        ("calldata: компилированный", timed(calldata_compiled)),
+        ("calldata: attest_calldata_many", timed(attest_calldata_many, ctx, fake, jobs)),
+    ]
+    for name, elapsed in results:
+        print(f"{name:<31} {elapsed / ATTESTATIONS * 1e6:7.1f} мкс/аттестация")
+
+
+if __name__ == "__main__":
+    main()
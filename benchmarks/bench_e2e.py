@@ -0,0 +1,189 @@
+"""
+Сквозной прогон без сети и без газа: main.start и Sign на N синтетических ключах против заглушки ноды
+(транзакции принимаются, квитанции выдаются) и заглушки API Sign (логин и scan со схемами).
+Зарегистрированная схема появляется в API сразу после приёма транзакции register, поэтому сценарий
+attestations идёт на схемах, созданных сценарием schemas.
+
+Отчёт по каждому сценарию: ключей/с, транзакций/с, p50/p99 этапов из utils.metrics и пиковый RSS процесса.
+С --json результаты сохраняются, с --baseline сравниваются с прошлым сохранением.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_e2e --keys 64 --threads 1,4,16
+    python -m benchmarks.bench_e2e --json before.json
+    python -m benchmarks.bench_e2e --baseline before.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import config
+import constants.constants as constants
+from benchmarks.stub_rpc import random_keys, start_stub
+from benchmarks.stub_sign_api import start_stub_api, synthetic_schema
+
+CHAIN = "opbnb"
+CHAIN_ID = 204
+RPC_LATENCY = 0.02
+API_LATENCY = 0.02
+RECEIPT_POLL = 0.2  # опрос квитанций в заглушке чаще, чем в проде: иначе ключ/с упирается в интервал опроса
+REPORT_STAGES = ("key", "login", "estimate_gas", "send_raw_transaction", "receipt", "schemas_sync", "db", "rpc")
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS - байты
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def stage_quantiles():
+    """p50/p99 по этапам; этапы с несколькими эндпоинтами (db, rpc) сливаются в один"""
+    from utils.metrics import Histogram, stages
+
+    merged = {}
+    for stage in stages():
+        histogram = merged.setdefault(stage.name, Histogram())
+        for bucket, count in stage.histogram.counts.items():
+            histogram.counts[bucket] = histogram.counts.get(bucket, 0) + count
+        histogram.count += stage.histogram.count
+        histogram.sum += stage.histogram.sum
+    return {name: histogram.quantiles((0.5, 0.99)) for name, histogram in merged.items()}
+
+
+async def scenario(mode, keys, threads, db):
+    import main
+    from utils import metrics
+    from utils.scheduler import Scheduler, WorkItem
+
+    metrics.reset()
+    scheduler = Scheduler(workers=threads, total=len(keys), limits=config.STAGE_LIMITS)
+    items = [WorkItem(key, mode, CHAIN) for key in keys]
+
+    started = time.perf_counter()
+    await scheduler.run(items, lambda thread, item, index: main.start(thread, item, index, scheduler, db))
+    elapsed = time.perf_counter() - started
+
+    sent = metrics.get_stage("send_raw_transaction", CHAIN).ok
+    return {
+        "mode": mode,
+        "threads": threads,
+        "keys": len(keys),
+        "failed": scheduler.progress.failed,
+        "keys_per_s": len(keys) / elapsed,
+        "tx_per_s": sent / elapsed,
+        "stages": stage_quantiles(),
+        "rss_mb": peak_rss_mb(),
+    }
+
+
+def print_result(result, baseline=None):
+    rss = f"{result['rss_mb']:.0f} МБ" if result["rss_mb"] is not None else "н/д"
+    line = (f"{result['mode']:<12} THREADS={result['threads']:<3} ключей/с {result['keys_per_s']:7.2f}  "
+            f"tx/с {result['tx_per_s']:7.2f}  ошибок {result['failed']}  пиковый RSS {rss}")
+    if baseline is not None:
+        line += f"  ({(result['keys_per_s'] / baseline['keys_per_s'] - 1) * 100:+.1f}% ключей/с)"
+    print(line)
+
+    for name in REPORT_STAGES:
+        if name not in result["stages"]:
+            continue
+        p50, p99 = result["stages"][name]
+        line = f"    {name:<22} p50 {p50 * 1000:8.1f} мс   p99 {p99 * 1000:8.1f} мс"
+        if baseline is not None and name in baseline["stages"] and baseline["stages"][name][1]:
+            line += f"   p99 {(p99 / baseline['stages'][name][1] - 1) * 100:+.1f}%"
+        print(line)
+
+
+async def run(args):
+    from utils.logger import logger
+
+    # Лог каждого ключа в stdout исказит замер, оставляем только предупреждения (после настройки в utils.logger)
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    rpc_server, rpc_url, chain = start_stub()
+    chain.latency = args.rpc_latency
+    api_server, api_url, api = start_stub_api()
+    api.latency = args.api_latency
+    schema_index = itertools.count(1)
+    chain.on_accept = lambda sender, tx_hash: api.add_schemas(sender, [synthetic_schema(sender, next(schema_index))])
+
+    # Адреса подменяются до импорта utils.sign и utils.schema_sync: они забирают их из constants при импорте
+    constants.rpc[CHAIN] = [rpc_url]
+    constants.chain_ids[CHAIN] = CHAIN_ID
+    constants.sign_api = f"{api_url}/api"
+    constants.scan_api = f"{api_url}/api/scan"
+
+    from utils.address_book import get_address_book
+    from utils.chain_context import close_chain_contexts, get_chain_context
+    from utils.database import Database
+    from utils.http_transport import close_transports
+
+    workdir = tempfile.mkdtemp(prefix="bench-e2e-")
+    threads_list = [int(value) for value in args.threads.split(",")]
+    scenarios = [(mode, threads) for mode in args.modes.split(",") for threads in threads_list]
+
+    # Все ключи прогона - в одном файле: из него же берутся получатели аттестаций
+    keys = {scenario_key: random_keys(args.keys) for scenario_key in scenarios}
+    keys_path = os.path.join(workdir, "private_keys.txt")
+    with open(keys_path, "w") as f:
+        f.writelines(f"{key}\n" for scenario_keys in keys.values() for key in scenario_keys)
+    get_address_book(keys_path)
+
+    get_chain_context(CHAIN).receipts.poll_interval = args.receipt_poll
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {(item["mode"], item["threads"]): item for item in json.load(f)}
+
+    results = []
+    try:
+        async with Database(os.path.join(workdir, "bench.db")) as db:
+            for mode, threads in scenarios:
+                result = await scenario(mode, keys[(mode, threads)], threads, db)
+                results.append(result)
+                print_result(result, baseline.get((mode, threads)))
+    finally:
+        await close_chain_contexts()
+        await close_transports()
+        rpc_server.shutdown()
+        api_server.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк на заглушках ноды и API Sign")
+    parser.add_argument("--keys", type=int, default=32, help="ключей на сценарий")
+    parser.add_argument("--threads", default="1,4,16", help="уровни конкурентности через запятую")
+    parser.add_argument("--modes", default="schemas,attestations", help="режимы через запятую, по порядку")
+    parser.add_argument("--rpc-latency", type=float, default=RPC_LATENCY, help="задержка ноды, секунд")
+    parser.add_argument("--api-latency", type=float, default=API_LATENCY, help="задержка API Sign, секунд")
+    parser.add_argument("--receipt-poll", type=float, default=RECEIPT_POLL, help="интервал опроса квитанций")
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    parser.add_argument("--baseline", help="сравнить с результатами из файла")
+    args = parser.parse_args()
+
+    config.USE_PROXY = False
+    config.PAUSE_BETWEEN_CREATIONS = [0, 0]
+    config.METRICS_PORT = None
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
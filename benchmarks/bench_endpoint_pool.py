@@ -0,0 +1,62 @@
+"""
+Задержка чтения через одну ноду и через пул нод, когда основная нода периодически тормозит.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_endpoint_pool
+"""
+import asyncio
+import random
+import statistics
+import time
+
+from web3 import AsyncWeb3
+
+from benchmarks.stub_rpc import StubChain, StubReplica, start_stub
+from utils.endpoint_pool import EndpointPool, PoolProvider
+
+REQUESTS = 200
+SLOW_SHARE = 0.1  # доля запросов, на которых основная нода "зависает"
+SLOW_LATENCY = 2.0
+
+
+class FlakyReplica(StubReplica):
+    @property
+    def latency(self):
+        return SLOW_LATENCY if random.random() < SLOW_SHARE else self.base_latency
+
+    @latency.setter
+    def latency(self, value):
+        self.base_latency = value
+
+
+async def measure(w3):
+    timings = []
+    for _ in range(REQUESTS):
+        started = time.perf_counter()
+        await w3.eth.get_balance("0x0000000000000000000000000000000000000001")
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+async def main():
+    chain = StubChain(latency=0.01)
+    primary, primary_url, _ = start_stub(FlakyReplica(chain, 0.01))
+    backup, backup_url, _ = start_stub(StubReplica(chain, 0.03))
+    try:
+        single = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(primary_url))
+        p50, p99 = await measure(single)
+        print(f"одна нода: p50 {p50 * 1000:6.1f} мс  p99 {p99 * 1000:7.1f} мс")
+
+        pool = EndpointPool([primary_url, backup_url])
+        p50, p99 = await measure(AsyncWeb3(PoolProvider(pool)))
+        print(f"пул нод:   p50 {p50 * 1000:6.1f} мс  p99 {p99 * 1000:7.1f} мс")
+        print(pool.summary())
+        await pool.close()
+    finally:
+        primary.shutdown()
+        backup.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+"""
+API Sign по HTTPS: отдельная сессия curl_cffi на каждый аккаунт против общего транспорта
+с cookie jar у каждого аккаунта. Каждый аккаунт логинится и читает свои схемы.
+
+Запуск из корня репозитория (нужен openssl):
+    python -m benchmarks.bench_http_transport
+"""
+import asyncio
+import time
+
+from curl_cffi.requests import AsyncSession
+
+import config
+from benchmarks.stub_rpc import random_keys
+from benchmarks.stub_sign_api import StubSignApi, start_stub_api
+from utils.address_book import derive_address
+from utils.http_transport import AccountSession, close_transports, get_transport
+
+ACCOUNTS = 200
+CONCURRENCY = 20
+CONNECT_LATENCY = 0.1  # ~3 RTT по 30 мс на TCP + TLS до удалённого API
+
+
+async def account_flow(session, base_url, address):
+    response = await session.post(f"{base_url}/api/signin", json={"key": address})
+    assert response.status_code == 201
+    response = await session.get(f"{base_url}/api/scan/addresses/{address}/schemas?page=1&size=100")
+    assert response.status_code == 200
+
+
+async def per_account(base_url, address):
+    session = AsyncSession(impersonate="chrome110", verify=False)
+    try:
+        await account_flow(session, base_url, address)
+    finally:
+        await session.close()
+
+
+async def shared(base_url, address):
+    session = AccountSession(get_transport())
+    try:
+        await account_flow(session, base_url, address)
+    finally:
+        await session.close()
+
+
+async def run(flow, base_url, addresses):
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(address):
+        async with semaphore:
+            await flow(base_url, address)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(address) for address in addresses))
+    return time.perf_counter() - started
+
+
+async def main():
+    config.USE_PROXY = False
+    config.HTTP_MAX_PER_HOST = CONCURRENCY
+    addresses = [derive_address(key) for key in random_keys(ACCOUNTS)]
+
+    for name, flow in (("сессия на аккаунт", per_account), ("общий транспорт", shared)):
+        api = StubSignApi(latency=0.005, connect_latency=CONNECT_LATENCY)
+        server, base_url, _ = start_stub_api(api, tls=True)
+        try:
+            elapsed = await run(flow, base_url, addresses)
+            await close_transports()
+        finally:
+            server.shutdown()
+        print(f"{name:<18} {ACCOUNTS / elapsed:7.1f} аккаунтов/с  соединений {api.connections:4}  "
+              f"чужих cookie {api.mismatched}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
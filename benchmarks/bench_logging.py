@@ -0,0 +1,59 @@
+"""
+Сколько времени logger.info отнимает у вызывающего потока при медленной записи (занятый диск, ротация
+со сжатием, консоль Windows): синхронный sink, enqueue=True у loguru и BackgroundSink из utils.logger.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_logging
+"""
+import threading
+import time
+
+from utils.logger import BackgroundSink, logger
+
+MESSAGES = 500  # пачка сообщений, как при одновременном завершении транзакций у многих потоков
+WRITE_DELAY = 0.001  # 1 мс на запись и столько же на flush
+
+
+class SlowSink:
+    """Как sys.stdout: есть flush, и loguru зовёт его после каждой записи"""
+    def __init__(self):
+        self.written = 0
+        self.caller_flushes = 0
+
+    def write(self, message):
+        time.sleep(WRITE_DELAY)
+        self.written += 1
+
+    def flush(self):
+        time.sleep(WRITE_DELAY)
+        if threading.current_thread() is threading.main_thread():
+            self.caller_flushes += 1
+
+
+def run(make_sink, **options):
+    sink = SlowSink()
+    logger.remove()
+    handler = logger.add(make_sink(sink), format="{time:HH:mm:ss.SS} {level} | {message}", **options)
+
+    started = time.perf_counter()
+    for index in range(MESSAGES):
+        logger.info(f"Поток {index % 32} | Schema created successfully: 0x{index:064x}")
+    elapsed = time.perf_counter() - started
+
+    logger.remove(handler)  # ждёт, пока запись в фоне допишет очередь
+    assert sink.written == MESSAGES
+    return elapsed / MESSAGES, sink.caller_flushes
+
+
+def main():
+    results = {
+        "синхронно": run(lambda sink: sink),
+        "enqueue=True": run(lambda sink: sink, enqueue=True),
+        "BackgroundSink": run(lambda sink: BackgroundSink(sink, "bench")),
+    }
+    for name, (per_call, caller_flushes) in results.items():
+        print(f"{name:<15} {per_call * 1e6:8.1f} мкс на вызов logger.info, flush в вызывающем потоке: {caller_flushes}")
+
+
+if __name__ == "__main__":
+    main()
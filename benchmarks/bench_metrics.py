@@ -0,0 +1,49 @@
+"""
+Цена замера этапа: пустой блок против того же блока под timer(), и запись в гистограмму.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_metrics
+"""
+import random
+import time
+
+from utils.metrics import Histogram, timer
+
+ROUNDS = 200_000
+
+
+def empty():
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        pass
+    return time.perf_counter() - started
+
+
+def timed_block():
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        with timer("bench", "opbnb", "stub"):
+            pass
+    return time.perf_counter() - started
+
+
+def record():
+    histogram = Histogram()
+    values = [random.lognormvariate(-3, 1) for _ in range(ROUNDS)]
+    started = time.perf_counter()
+    for value in values:
+        histogram.record(value)
+    return time.perf_counter() - started, histogram
+
+
+def main():
+    base = min(empty() for _ in range(5))
+    with_timer = min(timed_block() for _ in range(5))
+    elapsed, histogram = record()
+    print(f"timer():   {(with_timer - base) / ROUNDS * 1e9:6.0f} нс на замер")
+    print(f"record():  {elapsed / ROUNDS * 1e9:6.0f} нс на значение, корзин {len(histogram.counts)}")
+    print("p50/p90/p99: " + " / ".join(f"{value * 1000:.1f} мс" for value in histogram.quantiles()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Время создания Sign на один ключ: старый путь (ABI, провайдер, middleware и
+контракт заново на каждый ключ) против общего кэша utils.chain_context.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_sign_init
+"""
+import asyncio
+import json
+import time
+
+from fake_useragent import UserAgent
+from faker import Faker
+from web3.middleware import async_geth_poa_middleware
+
+from benchmarks.stub_rpc import random_keys
+from constants.constants import contract_addresses, rpc
+from utils.chain_context import ABI_PATH
+from utils.sign import Sign
+from utils.web3_utils import Web3Utils
+
+KEYS = 200
+CHAIN = "opbnb"
+
+
+def build_uncached(key):
+    # Повторяет то, что Sign.__init__ делал до кэша: тогда rpc[сеть] был одной строкой и на каждый ключ
+    # создавался свой AsyncHTTPProvider (со списком Web3Utils собрал бы EndpointPool)
+    w3 = Web3Utils(key=key, http_provider=rpc.get(CHAIN)[0])
+    with open(ABI_PATH, "r") as f:
+        abi = json.load(f)
+    w3.w3.eth.contract(address=contract_addresses.get(CHAIN), abi=abi)
+    w3.w3.middleware_onion.inject(async_geth_poa_middleware, layer=0)
+    Faker()
+    return UserAgent(os="Windows").chrome
+
+
+async def measure(build, keys):
+    started = time.perf_counter()
+    for key in keys:
+        obj = build(key)
+        if isinstance(obj, Sign):
+            await obj.logout()
+    return (time.perf_counter() - started) / len(keys) * 1000
+
+
+async def main():
+    keys = random_keys(KEYS)
+    before = await measure(build_uncached, keys)
+    after = await measure(lambda key: Sign(key=key, thread=1, db=None, chain=CHAIN), keys)
+    print(f"без кэша: {before:.3f} мс/ключ")
+    print(f"с кэшем:  {after:.3f} мс/ключ ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
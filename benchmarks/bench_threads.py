@@ -0,0 +1,53 @@
+"""
+Пропускная способность RPC-цикла транзакции в зависимости от числа потоков.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_threads
+"""
+import asyncio
+import time
+
+from benchmarks.stub_rpc import random_keys, start_stub
+from utils.web3_utils import Web3Utils
+
+TX_PER_RUN = 32
+THREADS = [1, 2, 4, 8, 16]
+
+
+async def send_one(w3):
+    transaction = {
+        'to': w3.acct.address,
+        'value': 0,
+        'nonce': await w3.w3.eth.get_transaction_count(w3.acct.address),
+        'chainId': 204,
+        'gasPrice': await w3.w3.eth.gas_price,
+    }
+    transaction['gas'] = await w3.w3.eth.estimate_gas(transaction)
+    signed_transaction = w3.sign_transaction(transaction)
+    tx_hash = await w3.send_raw_transaction(signed_transaction.rawTransaction)
+    await w3.wait_transaction(tx_hash)
+
+
+async def run(url, threads):
+    keys = iter(random_keys(TX_PER_RUN))
+
+    async def worker():
+        for key in keys:
+            await send_one(Web3Utils(key=key, http_provider=url))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(threads)))
+    return TX_PER_RUN / (time.perf_counter() - started)
+
+
+async def main():
+    server, url, _ = start_stub()
+    try:
+        for threads in THREADS:
+            print(f"THREADS={threads:<3} {await run(url, threads):8.1f} tx/s")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
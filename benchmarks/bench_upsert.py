@@ -0,0 +1,71 @@
+"""
+Запись синхронизированных схем: старый путь (schema_exists + insert_schema,
+новое соединение и коммит на каждую строку) против Database.upsert_schemas.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_upsert
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+import aiosqlite
+
+from utils.database import Database
+
+ROWS = 3000
+CHAIN = "opbnb"
+
+
+def synthetic_schemas(count):
+    return [{
+        "id": f"onchain_evm_204_{i:#x}",
+        "mode": "onchain",
+        "chainType": "evm",
+        "chainId": "204",
+        "schemaId": hex(i),
+        "transactionHash": "0x" + os.urandom(32).hex(),
+        "name": f"schema {i}",
+        "description": "synthetic",
+        "dataLocation": "onchain",
+        "revocable": True,
+        "maxValidFor": "0",
+        "resolver": "0x" + "00" * 20,
+        "registerTimestamp": 0,
+        "registrant": "0x" + "00" * 20,
+        "data": [{"name": "field", "type": "string"}],
+        "originalData": "{}",
+    } for i in range(count)]
+
+
+async def per_row(db, schemas):
+    # Так писал fetch_user_schemas до пакетной записи
+    for schema in schemas:
+        async with aiosqlite.connect(db.db_name) as conn:
+            async with conn.execute(f"SELECT 1 FROM {CHAIN}_schemas WHERE id = ?", (schema["id"],)) as cursor:
+                exists = await cursor.fetchone() is not None
+        if not exists:
+            async with aiosqlite.connect(db.db_name) as conn:
+                await conn.execute(f"INSERT INTO {CHAIN}_schemas VALUES ({', '.join('?' * 16)})", db.schema_row(schema))
+                await conn.commit()
+
+
+async def measure(write, schemas):
+    with tempfile.TemporaryDirectory() as tmp:
+        async with Database(os.path.join(tmp, "bench.db")) as db:
+            started = time.perf_counter()
+            await write(db, schemas)
+            return time.perf_counter() - started
+
+
+async def main():
+    schemas = synthetic_schemas(ROWS)
+    before = await measure(per_row, schemas)
+    after = await measure(lambda db, rows: db.upsert_schemas(rows, CHAIN), schemas)
+    print(f"по одной строке: {before:.2f} с на {ROWS} схем")
+    print(f"upsert_schemas:  {after:.3f} с на {ROWS} схем ({before / after:.0f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
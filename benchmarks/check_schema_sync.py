@@ -0,0 +1,68 @@
+"""
+Проверка синхронизации схем против заглушки API Sign: постраничный обход всех схем адреса
+и остановка --resume на первой странице, где все схемы уже лежат в базе.
+
+Запуск из корня репозитория (при расхождении падает с AssertionError):
+    python -m benchmarks.check_schema_sync
+"""
+import asyncio
+import os
+import tempfile
+
+import config
+import constants.constants as constants
+from benchmarks.stub_sign_api import start_stub_api, synthetic_schema
+
+CHAIN = "opbnb"
+ADDRESS = "0x" + "ab" * 20
+FIRST_SYNC = 250  # схем при первой синхронизации: 3 страницы по 100
+OLD = 1000  # схем в базе перед проверкой resume
+NEW = 30  # новых схем, которые resume должен дописать
+
+
+async def run():
+    server, api_url, api = start_stub_api()
+    api.latency = 0
+    # Адрес API подменяется до импорта utils.schema_sync: он забирает его из constants при импорте
+    constants.scan_api = f"{api_url}/api/scan"
+
+    from utils.database import Database
+    from utils.http_transport import AccountSession, close_transports, get_transport
+    from utils.schema_sync import SCHEMAS_PAGE_SIZE, SCHEMAS_PREFETCH, sync_address_schemas
+
+    session = AccountSession(get_transport())
+    workdir = tempfile.mkdtemp(prefix="check-sync-")
+    try:
+        async with Database(os.path.join(workdir, "sync.db")) as db:
+            # Все страницы: 250 схем - 3 запроса, последняя страница неполная
+            api.add_schemas(ADDRESS, [synthetic_schema(ADDRESS, index) for index in range(FIRST_SYNC, 0, -1)])
+            inserted = await sync_address_schemas(session, db, ADDRESS, CHAIN, resume=False)
+            assert inserted == FIRST_SYNC, inserted
+            assert api.requests["schemas"] == 3, api.requests
+            print(f"Полная синхронизация: {inserted} схем за {api.requests['schemas']} страницы")
+
+            # resume: новые схемы идут первыми, на второй странице - только старые, дальше не листаем
+            api.add_schemas(ADDRESS, [synthetic_schema(ADDRESS, index) for index in range(OLD, FIRST_SYNC, -1)])
+            await sync_address_schemas(session, db, ADDRESS, CHAIN, resume=False)
+            api.add_schemas(ADDRESS, [synthetic_schema(ADDRESS, index) for index in range(OLD + NEW, OLD, -1)])
+            api.requests.clear()
+
+            inserted = await sync_address_schemas(session, db, ADDRESS, CHAIN, resume=True)
+            pages = -(-(OLD + NEW) // SCHEMAS_PAGE_SIZE)
+            assert inserted == NEW, inserted
+            # Две нужные страницы плюс не больше SCHEMAS_PREFETCH скачанных наперёд
+            assert api.requests["schemas"] <= 2 + SCHEMAS_PREFETCH < pages, api.requests
+            print(f"Продолжение: {inserted} новых схем, запрошено страниц {api.requests['schemas']} из {pages}")
+    finally:
+        await close_transports()
+        server.shutdown()
+
+
+def main():
+    config.USE_PROXY = False
+    asyncio.run(run())
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Локальная заглушка JSON-RPC ноды для бенчмарков.
+
+Отвечает на минимальный набор eth_* методов с искусственной задержкой,
+чтобы можно было мерить конкурентность без реальной сети и газа.
+"""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ZERO_HASH = "0x" + "00" * 32
+
+
+class StubChain:
+    def __init__(self, chain_id=204, latency=0.05, balance=10 ** 18):
+        self.chain_id = chain_id
+        self.latency = latency
+        self.balance = balance
+        self.balances = {}  # адрес в нижнем регистре -> баланс, если у адреса он не такой, как у всех
+        self.block_number = 1
+        self.nonces = {}
+        self.receipts = {}
+        self.requests = {}
+        self.on_accept = None  # on_accept(sender, tx_hash) - после приёма транзакции (например, завести схему в API)
+        self.lock = threading.Lock()
+
+    def count(self, method):
+        with self.lock:
+            self.requests[method] = self.requests.get(method, 0) + 1
+
+    def handle(self, method, params):
+        self.count(method)
+        if method == "eth_chainId":
+            return hex(self.chain_id)
+        if method == "eth_blockNumber":
+            return hex(self.block_number)
+        if method == "eth_gasPrice":
+            return hex(10 ** 9)
+        if method == "eth_maxPriorityFeePerGas":
+            return hex(10 ** 9)
+        if method == "eth_getBalance":
+            return hex(self.balances.get(params[0].lower(), self.balance))
+        if method == "eth_estimateGas":
+            return hex(150_000)
+        if method == "eth_call":
+            return "0x" + "00" * 32
+        if method == "eth_getTransactionCount":
+            with self.lock:
+                return hex(self.nonces.get(params[0].lower(), 0))
+        if method == "eth_getBlockByNumber":
+            return self.block()
+        if method == "eth_feeHistory":
+            block_count = int(params[0], 16) if isinstance(params[0], str) else params[0]
+            return {
+                "oldestBlock": hex(self.block_number),
+                "baseFeePerGas": [hex(10 ** 9)] * (block_count + 1),
+                "gasUsedRatio": [0.5] * block_count,
+                "reward": [[hex(10 ** 8)] * len(params[2])] * block_count,
+            }
+        if method == "eth_sendRawTransaction":
+            return self.accept(params[0])
+        if method == "eth_getTransactionReceipt":
+            return self.receipts.get(params[0])
+        if method == "eth_getTransactionByHash":
+            receipt = self.receipts.get(params[0])
+            return None if receipt is None else {"hash": params[0], "from": receipt["from"]}
+        raise ValueError(f"method {method} is not supported by stub")
+
+    def accept(self, raw_tx):
+        import rlp
+        from eth_account import Account
+        from eth_utils import big_endian_to_int, keccak
+
+        raw = bytes.fromhex(raw_tx[2:])
+        tx_hash = "0x" + keccak(raw).hex()
+        sender = Account.recover_transaction(raw_tx)
+        # Типизированная транзакция (EIP-2718): байт типа, потом chainId и nonce; legacy - nonce первым полем
+        fields = rlp.decode(raw[1:]) if raw[0] < 0x7f else rlp.decode(raw)
+        nonce = big_endian_to_int(fields[1] if raw[0] < 0x7f else fields[0])
+        with self.lock:
+            if tx_hash in self.receipts:
+                raise ValueError("already known")
+            expected = self.nonces.get(sender.lower(), 0)
+            if nonce != expected:
+                raise ValueError(f"nonce too {'low' if nonce < expected else 'high'}: next nonce {expected}, tx nonce {nonce}")
+            self.block_number += 1
+            self.nonces[sender.lower()] = self.nonces.get(sender.lower(), 0) + 1
+            self.receipts[tx_hash] = {
+                "blockHash": ZERO_HASH,
+                "blockNumber": hex(self.block_number),
+                "contractAddress": None,
+                "cumulativeGasUsed": hex(150_000),
+                "effectiveGasPrice": hex(10 ** 9),
+                "from": sender,
+                "gasUsed": hex(150_000),
+                "logs": [],
+                "logsBloom": "0x" + "00" * 256,
+                "status": "0x1",
+                "to": None,
+                "transactionHash": tx_hash,
+                "transactionIndex": "0x0",
+                "type": "0x0",
+            }
+        if self.on_accept is not None:
+            self.on_accept(sender, tx_hash)
+        return tx_hash
+
+    def block(self):
+        return {
+            "number": hex(self.block_number),
+            "hash": ZERO_HASH,
+            "parentHash": ZERO_HASH,
+            "baseFeePerGas": hex(10 ** 9),
+            "timestamp": hex(int(time.time())),
+            "gasLimit": hex(30_000_000),
+            "gasUsed": "0x0",
+            "miner": "0x" + "00" * 20,
+            "extraData": "0x",
+            "transactions": [],
+        }
+
+
+class StubReplica:
+    """Ещё одна нода той же сети: общее состояние с chain, своя задержка"""
+    def __init__(self, chain, latency):
+        self.chain = chain
+        self.latency = latency
+
+    def handle(self, method, params):
+        return self.chain.handle(method, params)
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Клиент отменил запрос (например, предзагрузку страницы) - это не ошибка заглушки
+        pass
+
+
+def make_handler(chain):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length))
+            time.sleep(chain.latency)
+
+            if isinstance(payload, list):
+                response = [self.dispatch(item) for item in payload]
+            else:
+                response = self.dispatch(payload)
+
+            body = json.dumps(response).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def dispatch(self, request):
+            try:
+                result = chain.handle(request["method"], request.get("params", []))
+                return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+            except Exception as err:
+                return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32000, "message": str(err)}}
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_stub(chain=None, host="127.0.0.1", port=0):
+    """Поднимает заглушку в фоновом потоке, возвращает (server, url, chain)"""
+    chain = chain or StubChain()
+    server = QuietHTTPServer((host, port), make_handler(chain))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://{host}:{server.server_address[1]}"
+    return server, url, chain
+
+
+def random_keys(count):
+    return ["0x" + os.urandom(32).hex() for _ in range(count)]
@@ -0,0 +1,155 @@
+"""
+Локальная заглушка API app.sign.global: логин и scan-эндпоинт со списком схем адреса.
+С tls=True отвечает по HTTPS с самоподписанным сертификатом (нужен openssl в PATH).
+"""
+import json
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.stub_rpc import QuietHTTPServer
+
+
+class StubSignApi:
+    def __init__(self, latency=0.02, connect_latency=0):
+        self.latency = latency
+        self.connect_latency = connect_latency  # имитация сетевых RTT на установку соединения и TLS
+        self.schemas = {}  # адрес (lower) -> [схемы, новые первыми]
+        self.requests = {}
+        self.connections = 0  # сколько TCP-соединений приняла заглушка
+        self.sessions = {}  # cookie session -> адрес, с которым логинились
+        self.mismatched = 0  # запросы схем с cookie чужого аккаунта
+        self.lock = threading.Lock()
+
+    def count(self, name):
+        with self.lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+
+    def add_schemas(self, address, schemas):
+        with self.lock:
+            self.schemas[address.lower()] = list(schemas) + self.schemas.get(address.lower(), [])
+
+    def page(self, address, page, size):
+        with self.lock:
+            rows = self.schemas.get(address.lower(), [])
+            return {
+                "success": True,
+                "data": {"rows": rows[(page - 1) * size:page * size], "total": len(rows), "page": page, "size": size},
+            }
+
+
+def synthetic_schema(address, index, chain_id=204):
+    return {
+        "id": f"onchain_evm_{chain_id}_{index:#x}",
+        "mode": "onchain",
+        "chainType": "evm",
+        "chainId": str(chain_id),
+        "schemaId": hex(index),
+        "transactionHash": "0x" + f"{index:064x}",
+        "name": f"schema {index}",
+        "description": "stub",
+        "dataLocation": "onchain",
+        "revocable": True,
+        "maxValidFor": "0",
+        "resolver": "0x" + "00" * 20,
+        "registerTimestamp": int(time.time() * 1000),
+        "registrant": address,
+        "data": [{"name": "field", "type": "string"}, {"name": "flag", "type": "bool"}],
+        "originalData": "{}",
+    }
+
+
+def make_handler(api):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            time.sleep(api.connect_latency)
+            if isinstance(self.request, ssl.SSLSocket):
+                self.request.do_handshake()
+            super().setup()
+            with api.lock:
+                api.connections += 1
+
+        def session_cookie(self):
+            for part in self.headers.get("Cookie", "").split(";"):
+                name, _, value = part.strip().partition("=")
+                if name == "session":
+                    return value
+            return None
+
+        def reply(self, status, payload, cookie=None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if cookie:
+                self.send_header("Set-Cookie", f"session={cookie}; Path=/; HttpOnly")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(api.latency)
+            if self.path.startswith("/api/signin"):
+                api.count("signin")
+                session = os.urandom(8).hex()
+                with api.lock:
+                    api.sessions[session] = json.loads(body or b"{}").get("key", "").lower()
+                self.reply(201, {"success": True}, cookie=session)
+            else:
+                self.reply(404, {"success": False})
+
+        def do_GET(self):
+            time.sleep(api.latency)
+            url = urlparse(self.path)
+            parts = url.path.strip("/").split("/")
+            # /api/scan/addresses/{address}/schemas
+            if parts[:3] == ["api", "scan", "addresses"] and len(parts) == 5 and parts[4] == "schemas":
+                api.count("schemas")
+                session = self.session_cookie()
+                if session is not None and api.sessions.get(session) != parts[3].lower():
+                    with api.lock:
+                        api.mismatched += 1
+                query = parse_qs(url.query)
+                page = int(query.get("page", ["1"])[0])
+                size = int(query.get("size", ["100"])[0])
+                self.reply(200, api.page(parts[3], page, size))
+            else:
+                self.reply(404, {"success": False})
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def self_signed_context():
+    directory = tempfile.mkdtemp(prefix="stub-tls-")
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1",
+         "-keyout", key, "-out", cert],
+        check=True, capture_output=True)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+def start_stub_api(api=None, host="127.0.0.1", port=0, tls=False):
+    """Поднимает заглушку в фоновом потоке, возвращает (server, base_url, api)"""
+    api = api or StubSignApi()
+    server = QuietHTTPServer((host, port), make_handler(api))
+    scheme = "http"
+    if tls:
+        # Рукопожатие - в потоке обработчика (setup), а не в потоке accept
+        server.socket = self_signed_context().wrap_socket(
+            server.socket, server_side=True, do_handshake_on_connect=False)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://{host}:{server.server_address[1]}", api
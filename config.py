@@ -3,10 +3,36 @@ PROXY = 'http://username:password@ip:port'
 USE_PROXY = True
 
 THREADS = 1 #кол-во потоков
+PROCESSES = 1  # кол-во процессов, ключи делятся между ними поровну, в каждом по THREADS потоков
+HTTP_MAX_CLIENTS = 20  # сколько запросов к API Sign одновременно на процесс (соединения общие для всех аккаунтов)
+HTTP_MAX_PER_HOST = 10  # сколько соединений держать к одному хосту
+STAGE_LIMITS = {"login": 5, "rpc": 20, "db": 5}  # сколько потоков одновременно могут быть на этапе, None - без ограничения
 
 SCHEMAS_TO_CREATE = [1, 1] # скоко схем создавать на каждом акке за 1 прогон мин макс
 ATTESTATIONS_TO_CREATE = [1, 1] # тоже самое шо выше токо для аттестаций
 PAUSE_BETWEEN_CREATIONS = [5, 15] # пауза между созданием схемы/аттестации
 
+PIPELINE_STAGES = []  # конвейер вместо потоков: ["sign"] - только подписать в базу, ["broadcast"] - только разослать, оба - по очереди
+BROADCAST_RATE = 5  # сколько подписанных транзакций в секунду рассылать, 0 - без паузы
+
+PREFLIGHT = True  # перед работой одним batch-запросом проверить балансы и отложить ключи без денег на газ в reports/unfunded_keys.txt
+
+METRICS_INTERVAL = 60  # раз во сколько секунд печатать таблицу задержек этапов и обновлять reports/metrics.prom, 0 - только в конце
+METRICS_PORT = None  # порт для /metrics в формате Prometheus, например 9108, None - не открывать
+
+LOG_ENQUEUE = True  # писать логи из фонового потока, чтобы запись на диск и в консоль не тормозила потоки
+LOG_ROTATION = "50 MB"  # когда начинать новый файл лога: по размеру ("50 MB") или по времени ("00:00", "1 day")
+LOG_RETENTION = 10  # сколько старых файлов лога хранить
+LOG_COMPRESSION = "zip"  # чем сжимать старые файлы лога, None - не сжимать
+LOG_JSON = False  # дополнительно писать logs/out.jsonl: по строке JSON на запись с полями thread, address, chain, tx_hash
+
+USE_UVLOOP = True  # на Linux/macOS использовать uvloop, если установлен (pip install uvloop)
+
+KEYS_RANGE = [0, None]  # какие строки файла ключей брать в работу: [с какой, до какой (не включая)], None - до конца
+
 MIN_PAUSE = 5  #пауза между потоками мин и макс
-MAX_PAUSE = 10
\ No newline at end of file
+MAX_PAUSE = 10
+
+FIXED_GAS_PRICE = {"bsc": 1}  # фиксированный gasPrice в gwei по сетям, в остальных сетях цена берётся из ноды
+EIP1559_CHAINS = []  # сети, где слать транзакции типа 2 с комиссией по eth_feeHistory, например ["opbnb", "polygon"]
+GAS_PRICE_TTL = 5  # сколько секунд цена газа живёт в кэше
\ No newline at end of file
@@ -4,10 +4,22 @@ contract_addresses = {
     "polygon": "0xe2C15B97F628B7Ad279D6b002cEDd414390b6D63"
 }
 
+# Несколько нод на сеть: запросы идут на самую быструю живую (utils/endpoint_pool.py)
 rpc = {
-    "bsc": "https://rpc.ankr.com/bsc",
-    "opbnb": "https://opbnb-rpc.publicnode.com",
-    "polygon": "https://1rpc.io/matic"
+    "bsc": [
+        "https://rpc.ankr.com/bsc",
+        "https://bsc-dataseed.bnbchain.org",
+        "https://bsc-rpc.publicnode.com",
+    ],
+    "opbnb": [
+        "https://opbnb-rpc.publicnode.com",
+        "https://opbnb-mainnet-rpc.bnbchain.org",
+    ],
+    "polygon": [
+        "https://1rpc.io/matic",
+        "https://polygon-rpc.com",
+        "https://polygon-bor-rpc.publicnode.com",
+    ]
 }
 
 chain_ids = {
@@ -20,4 +32,7 @@ explorers = {
     "opbnb": "https://opbnb.bscscan.com/tx/",
     "bsc": "https://bscscan.com/tx/",
     "polygon": "https://polygonscan.com/tx/"
-}
\ No newline at end of file
+}
+
+sign_api = "https://app.sign.global/api"
+scan_api = "https://mainnet-rpc.sign.global/api/scan"
@@ -1,163 +1,360 @@
-# Глобальный счётчик ключей и ошибок
+import argparse
 import asyncio
 import os
 import random
-
-import time
-from asyncio import WindowsSelectorEventLoopPolicy
-
-from rich.console import Console
-from rich.prompt import Prompt
+import sys
 
 import config
 from utils.database import Database
+from utils.event_loop import run_async
+from utils.key_loader import KEYS_PATH, KeyLoader
 from utils.logger import logger
-from utils.sign import Sign
-
-console = Console()
-global_key_index = 0
-error_count = 0  # Глобальный счётчик ошибок
-last_error_time = None  # Время последней ошибки
-key_lock = asyncio.Lock()  # Блокировка для синхронизации доступа к счётчику
-error_lock = asyncio.Lock()  # Блокировка для синхронизации ошибок
-heroes_ranks = {}
-heroes_ranks_ready = asyncio.Event()
-
-# Максимальное время между ошибками для их учета как последовательных (например, 60 секунд)
-MAX_TIME_BETWEEN_ERRORS = 30
-
-async def read_private_keys(filepath):
-    with open(filepath, 'r') as file:
-        keys = file.readlines()
-    return [key.strip() for key in keys]
-
+from utils.metrics import finish_reporting, start_reporting, timer
+from utils.retry import call_with_retry
+from utils.scheduler import Scheduler, WorkItem
 
-async def count_keys(filepath):
-    with open(filepath, 'r') as file:
-        return len(file.readlines())
+# web3, eth_account, curl_cffi, Faker и rich импортируются внутри функций, которым они нужны:
+# --help, пробный прогон и координатор процессов запускаются без них
 
+heroes_ranks = {}
+heroes_ranks_ready = asyncio.Event()
 
-async def retry_function(func, thread, key, *args, **kwargs):
-    global error_count, last_error_time  # Используем глобальные переменные
-    for _ in range(7):
-        try:
-            result = await func(*args, **kwargs)
-            return result
-        except Exception as e:
-            logger.error(f"Поток {thread} | Ошибка выполнения функции {func.__name__}: {e}")
+PROGRESS_INTERVAL = 5  # как часто шард отчитывается координатору, секунд
+CHAIN_NAMES = {"bsc": "BSC", "opbnb": "opBNB", "polygon": "Polygon"}
 
-            async with error_lock:
-                current_time = time.time()  # Получаем текущее время
 
-                # Если это первая ошибка или предыдущая ошибка была слишком давно, сбрасываем счётчик
-                if last_error_time is None or current_time - last_error_time > MAX_TIME_BETWEEN_ERRORS:
-                    error_count = 1  # Сброс счётчика и начало новой серии ошибок
-                else:
-                    error_count += 1  # Увеличиваем счётчик, так как ошибка произошла в пределах допустимого интервала
+class KeyFailed(Exception):
+    """Ключ не доделан: планировщик считает его ошибкой, ключ пишется в reports/failed_keys.txt"""
 
-                last_error_time = current_time  # Обновляем время последней ошибки
 
-                # Если достигнуто 7 ошибок подряд, пауза для потока
-                if error_count >= 7:
-                    logger.warning(f"Поток {thread} | 7 ошибок подряд. Пауза на 5 минут.")
-                    # Пауза на 10 минут для потока
-                    await asyncio.sleep(300)  # Пауза на 5 минут (300 секунд)
-                    # Сброс счётчика ошибок после паузы
-                    error_count = 0
+async def retry_function(func, thread, *args, endpoint, gate=None, **kwargs):
+    """
+    Вызов через движок повторов (свой предохранитель и бюджет на каждый эндпоинт).
+    Если так и не вышло - KeyFailed.
+    """
+    try:
+        return await call_with_retry(func, *args, endpoint=endpoint, label=f"Поток {thread}", gate=gate, **kwargs)
+    except Exception as e:
+        raise KeyFailed(f"ошибка выполнения функции {func.__name__}: {e}") from e
 
-            await asyncio.sleep(5)  # Ожидание перед повтором
 
+def record_failed_key(thread, key):
     try:
         filepath = os.path.join(os.path.dirname(__file__), 'reports/failed_keys.txt')
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
         with open(filepath, "a") as f:
             f.write(f"{key}\n")
         logger.info(f"Поток {thread} | Ключ {key} записан в файл.")
     except Exception as file_error:
         logger.error(f"Не удалось записать ключ в файл: {file_error}")
 
-async def start(thread, keys, semaphore, key_count, mode, network, db):
-    logger.info(f"Поток {thread} | Начал работу")
-
-    try:
-        async with semaphore:
-            for key in keys:
-                sign = Sign(key=key, thread=thread, db=db, chain=network)
-                # Синхронизируем доступ к глобальному счётчику ключей
-                async with key_lock:
-                    global global_key_index
-                    global_key_index += 1
-                    current_key_index = global_key_index
-
-                logger.info(
-                    f"Поток {thread} работает с ключем ...{key[29:]} | {sign.address} | {current_key_index} of {key_count}")
 
-                await retry_function(sign.login, thread, key)
+async def start(thread, item, index, scheduler, db, resume=False):
+    from utils.sign import Sign
 
-                if mode == "schemas":
-                    created_schemas = 0
-                    for _ in range(random.randint(config.SCHEMAS_TO_CREATE[0], config.SCHEMAS_TO_CREATE[1])):
-                        if await sign.create_schema():
-                            await asyncio.sleep(random.randint(config.PAUSE_BETWEEN_CREATIONS[0], config.PAUSE_BETWEEN_CREATIONS[1]))
-                            created_schemas += 1
-
-                    if created_schemas > 0:
-                        logger.info(f"Поток {thread} | Создано {created_schemas} новых схем, запишу их в базу")
-                        await retry_function(sign.fetch_user_schemas, thread, key, network)
-
-                if mode == "attestations":
-                    created_attestations = 0
-                    for _ in range(random.randint(config.ATTESTATIONS_TO_CREATE[0], config.ATTESTATIONS_TO_CREATE[1])):
-                        schema_id = await db.get_random_schema_id(chain=network)
-                        if await sign.create_attestation(schema_id):
-                            created_attestations += 1
-                            await asyncio.sleep(random.randint(config.PAUSE_BETWEEN_CREATIONS[0], config.PAUSE_BETWEEN_CREATIONS[1]))
-
-                    logger.info(f"Поток {thread} | Создано {created_attestations} аттестаций")
-
-                await sign.logout()
-
-    except StopIteration:
-        logger.info(f"Поток {thread} | Закончил работу")
-
-
-async def main():
-    db = Database()
-    await db.initialize_db()
-
-    console.print("[yellow]Выберите режим работы:[/yellow] \n 1: Создание схем \n 2: Создание аттестаций")
-    mode = Prompt.ask("Введите 1 или 2", choices=["1", "2"])
-    mode = "schemas" if mode == "1" else "attestations"
-
-    console.print("[yellow]Выберите сеть: \n 1: BSC \n 2: opBNB \n 3: Polygon [/yellow]")
-    network_options = {
-        "1": "BSC",
-        "2": "opBNB",
-        "3": "Polygon"
-    }
-    network_choice = Prompt.ask("Введите 1, 2 или 3", choices=["1", "2", "3"])
-    network = {"1": "bsc", "2": "opbnb", "3": "polygon"}[network_choice]
+    sign = Sign(key=item.key, thread=thread, db=db, chain=item.chain)
+    # Поля контекста попадают в каждую запись по этому ключу (и в JSON-лог), в том числе из задач, запущенных внутри
+    with logger.contextualize(thread=thread, address=sign.address, chain=item.chain):
+        try:
+            await process_key(sign, thread, item, index, scheduler, db, resume)
+        except KeyFailed:
+            record_failed_key(thread, item.key)
+            raise
 
-    console.print(f"\n✅ Выбран режим: [bold]{mode}[/bold], Сеть: [bold]{network_options[network_choice]}[/bold]\n")
 
-    thread_count = config.THREADS
+async def journal_complete(db, key_fingerprint, mode, network, target) -> bool:
+    journal = await db.get_journal(key_fingerprint, mode, network)
+    return journal["confirmed"] >= target and not journal["pending"]
 
-    filepath = os.path.join(os.path.dirname(__file__), 'data/private_keys.txt')
 
-    keys = await read_private_keys(filepath)
-    key_count = await count_keys(filepath)
+async def process_key(sign, thread, item, index, scheduler, db, resume=False):
+    key, mode, network = item
+    key_fingerprint = sign.fingerprint
 
-    tasks = []
-    keys_iterator = iter(keys)
+    logger.info(
+        f"Поток {thread} работает с ключем ...{key[29:]} | {sign.address} | {index} of {scheduler.progress.total}")
 
-    semaphore = asyncio.Semaphore(thread_count)
+    # Журнал: при --resume пропускаем сделанное и перепроверяем транзакции без квитанций
+    journal = await db.get_journal(key_fingerprint, mode, network) if resume else None
+    if journal is None:
+        counts = config.SCHEMAS_TO_CREATE if mode == "schemas" else config.ATTESTATIONS_TO_CREATE
+        journal = {"state": "started", "target": random.randint(counts[0], counts[1]), "confirmed": 0, "pending": []}
+        await db.start_journal(key_fingerprint, mode, network, sign.address, journal["target"])
+    elif journal["pending"] or journal["confirmed"]:
+        logger.info(f"Поток {thread} | Продолжаю: подтверждено {journal['confirmed']}, "
+                    f"без квитанции {len(journal['pending'])} из {journal['target']}")
 
-    for thread in range(1, thread_count + 1):
-        tasks.append(asyncio.create_task(start(thread, keys_iterator, semaphore, key_count, mode, network, db)))
+    try:
+        if await retry_function(sign.login, thread, endpoint="sign_api", gate=lambda: scheduler.limit("login")):
+            await db.set_journal(key_fingerprint, mode, network, sign.address, "logged_in")
+
+        # Транзакции уходят без ожидания квитанций, подтверждения собираем в конце
+        confirmations = [sign.recheck_transaction(tx_hash, mode) for tx_hash in journal["pending"]]
+        remaining = 0
+        if journal["state"] != "created":
+            remaining = max(0, journal["target"] - journal["confirmed"] - len(journal["pending"]))
+
+        if mode == "schemas":
+            for _ in range(remaining):
+                confirmation = await sign.create_schema(gate=lambda: scheduler.limit("rpc"))
+                if confirmation:
+                    confirmations.append(confirmation)
+                    with timer("pause", network):
+                        await asyncio.sleep(random.randint(config.PAUSE_BETWEEN_CREATIONS[0], config.PAUSE_BETWEEN_CREATIONS[1]))
+
+            created_schemas = sum(await asyncio.gather(*confirmations))
+            # created - все схемы подтверждены, осталось записать их в базу; иначе при --resume досоздаём недостающие
+            complete = await journal_complete(db, key_fingerprint, mode, network, journal["target"])
+            await db.set_journal(key_fingerprint, mode, network, sign.address, "created" if complete else "incomplete")
+            if created_schemas + journal["confirmed"] > 0:
+                logger.info(f"Поток {thread} | Создано {created_schemas} новых схем, запишу их в базу")
+                # Схемы не записаны - KeyFailed, ключ останется в состоянии created и при --resume синхронизируется снова
+                await retry_function(sign.fetch_user_schemas, thread, network,
+                                     endpoint="scan_api", gate=lambda: scheduler.limit("db"))
+
+        if mode == "attestations":
+            for _ in range(remaining):
+                async with scheduler.limit("db"):
+                    schema = await db.get_random_schema(chain=network)
+                if schema is None:
+                    raise KeyFailed(f"в базе нет схем для сети {network}, сначала создайте схемы")
+                schema_id, fields = schema
+                confirmation = await sign.create_attestation(schema_id, fields, gate=lambda: scheduler.limit("rpc"))
+                if confirmation:
+                    confirmations.append(confirmation)
+                    with timer("pause", network):
+                        await asyncio.sleep(random.randint(config.PAUSE_BETWEEN_CREATIONS[0], config.PAUSE_BETWEEN_CREATIONS[1]))
+
+            created_attestations = sum(await asyncio.gather(*confirmations))
+            logger.info(f"Поток {thread} | Создано {created_attestations} аттестаций")
+
+        # done - только когда подтверждено сколько задумано и ничего не висит без квитанции:
+        # такие ключи --resume пропускает, остальные перепроверяет и досоздаёт
+        if not await journal_complete(db, key_fingerprint, mode, network, journal["target"]):
+            await db.set_journal(key_fingerprint, mode, network, sign.address, "incomplete")
+            raise KeyFailed("доделан не полностью, продолжится при --resume")
+        await db.set_journal(key_fingerprint, mode, network, sign.address, "done")
+    finally:
+        await sign.logout()
+
+
+def range_addresses(mode, path, keys_range):
+    """Адреса для проверки балансов: в режиме схем - только диапазон, таблица всего файла не нужна"""
+    from utils.address_book import AddressCache, get_address_book
+
+    if mode == "attestations":
+        return get_address_book(path)
+    return AddressCache(path, keys_range)
+
+
+async def run_keys(mode, network, keys_range, threads, on_progress=None, resume=False, path=KEYS_PATH):
+    """
+    Прогон ключей из диапазона строк файла в текущем процессе. on_progress(snapshot) вызывается
+    раз в PROGRESS_INTERVAL секунд и в конце - так шард сообщает о себе координатору.
+    """
+    from utils.address_book import fingerprint, get_address_book
+    from utils.balance_scan import BalanceScan
+    from utils.chain_context import close_chain_contexts, get_chain_context
+    from utils.http_transport import close_transports
+
+    async with Database() as db:
+        # Ключи читаются из файла по мере надобности, в памяти весь список не держим
+        loader = KeyLoader(path, *keys_range)
+        key_count = loader.count()
+
+        if mode == "attestations":
+            # Таблица адресов всего файла (получатели аттестаций): считается один раз, дальше из кэша рядом с файлом ключей
+            get_address_book(path)
+
+        done = set()
+        if resume:
+            done = await db.get_journal_done(mode, network)
+            logger.info(f"Продолжаю прогон: по журналу уже готово ключей - {len(done)}")
+
+        scheduler = Scheduler(workers=threads, total=key_count, limits=config.STAGE_LIMITS)
+        items = (WorkItem(key, mode, network) for key in loader if fingerprint(key) not in done)
+        scan = None
+        if config.PREFLIGHT:
+            # Ключи без денег на газ отсеиваются пачками до логина, воркеры их не получают
+            scan = BalanceScan(network, mode, range_addresses(mode, path, keys_range))
+            items = scan.filter(items)
+
+        metrics_reporter = start_reporting()
+        reporter = None
+        if on_progress is not None:
+            async def report():
+                while True:
+                    await asyncio.sleep(PROGRESS_INTERVAL)
+                    on_progress(scheduler.progress.snapshot())
+            reporter = asyncio.create_task(report())
 
-    await asyncio.gather(*tasks)
+        try:
+            await scheduler.run(items, lambda thread, item, index: start(thread, item, index, scheduler, db, resume))
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+            finish_reporting(metrics_reporter)
+
+        logger.info(f"Ключи: {scheduler.progress.summary()}")
+        if loader.invalid or loader.duplicates:
+            logger.warning(f"Пропущено ключей: битых {loader.invalid}, дубликатов {loader.duplicates}")
+        unfunded = scan.unfunded if scan is not None else 0
+        if unfunded:
+            logger.warning(f"Отложено ключей без денег на газ: {unfunded}, см. reports/unfunded_keys.txt")
+        logger.info(get_chain_context(network).estimates.summary())
+        logger.info(get_chain_context(network).pool.summary())
+        await close_chain_contexts()
+        await close_transports()
+
+        snapshot = scheduler.progress.snapshot()
+        snapshot.update(invalid=loader.invalid, duplicates=loader.duplicates, unfunded=unfunded)
+        if on_progress is not None:
+            on_progress(snapshot)
+        return snapshot
+
+
+async def run_pipeline_keys(mode, network, keys_range, stages, path=KEYS_PATH) -> int:
+    """
+    Режим конвейера: сначала все транзакции подписываются и ложатся в базу, потом рассылаются.
+    Возвращает число транзакций, которые рассылка так и не подтвердила.
+    """
+    from utils.address_book import get_address_book
+    from utils.chain_context import close_chain_contexts
+    from utils.http_transport import close_transports
+    from utils.pipeline import run_pipeline
+
+    async with Database() as db:
+        loader = KeyLoader(path, *keys_range)
+
+        if mode == "attestations":
+            get_address_book(path)
+
+        metrics_reporter = start_reporting()
+        try:
+            unconfirmed = await run_pipeline(db, loader, mode, network, stages)
+        finally:
+            finish_reporting(metrics_reporter)
+            await close_chain_contexts()
+            await close_transports()
+
+        if loader.invalid or loader.duplicates:
+            logger.warning(f"Пропущено ключей: битых {loader.invalid}, дубликатов {loader.duplicates}")
+        return unconfirmed
+
+
+async def dry_run_keys(mode, network, keys_range, path=KEYS_PATH, resume=False):
+    """Пробный прогон: без логина и транзакций считает, сколько ключей пойдёт в работу и сколько отсеется"""
+    from utils.address_book import fingerprint
+    from utils.balance_scan import BalanceScan
+    from utils.chain_context import close_chain_contexts
+
+    done = set()
+    if resume:
+        async with Database() as db:
+            done = await db.get_journal_done(mode, network)
+
+    loader = KeyLoader(path, *keys_range)
+    already_done = 0
+
+    def pending():
+        nonlocal already_done
+        for key in loader:
+            if fingerprint(key) in done:
+                already_done += 1
+                continue
+            yield WorkItem(key, mode, network)
+
+    scan = BalanceScan(network, mode, range_addresses(mode, path, keys_range), path=None)
+    try:
+        ready = 0
+        async for _ in scan.filter(pending()):
+            ready += 1
+    finally:
+        await close_chain_contexts()
+
+    logger.info(f"Пробный прогон {mode} в {CHAIN_NAMES[network]}: в работу пойдёт {ready}, "
+                f"без денег на газ {scan.unfunded}, уже готово по журналу {already_done}, "
+                f"битых {loader.invalid}, дубликатов {loader.duplicates}")
+    return {"total": ready, "done": 0, "failed": 0, "unfunded": scan.unfunded}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Sign Protocol: схемы и аттестации. Без --mode/--chain режим и сеть спрашиваются в терминале")
+    parser.add_argument("--mode", choices=["schemas", "attestations"], help="что создавать")
+    parser.add_argument("--chain", nargs="+", choices=list(CHAIN_NAMES), help="сеть, несколько - по очереди")
+    parser.add_argument("--threads", type=int, default=config.THREADS, help="потоков на процесс")
+    parser.add_argument("--processes", type=int, default=config.PROCESSES, help="процессов")
+    parser.add_argument("--keys-file", default=KEYS_PATH, help="файл приватных ключей")
+    parser.add_argument("--from-line", type=int, default=config.KEYS_RANGE[0],
+                        help="с какой строки файла ключей начинать (с нуля)")
+    parser.add_argument("--to-line", type=int, default=config.KEYS_RANGE[1],
+                        help="до какой строки файла ключей (не включая), по умолчанию до конца")
+    parser.add_argument("--pipeline", nargs="+", choices=["sign", "broadcast"], default=config.PIPELINE_STAGES or None,
+                        help="конвейер вместо потоков: sign - подписать в базу, broadcast - разослать")
+    parser.add_argument("--resume", action="store_true",
+                        help="продолжить прерванный прогон: пропустить готовые по журналу ключи и перепроверить транзакции")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="только посчитать ключи и проверить балансы: без логина и транзакций")
+    args = parser.parse_args(argv)
+
+    if args.mode is None or args.chain is None:
+        if not sys.stdin.isatty():
+            # cron/systemd: спросить некого
+            parser.error("без терминала нужно указать --mode и --chain")
+        ask_interactive(args)
+    return args
+
+
+def ask_interactive(args):
+    from rich.console import Console
+    from rich.prompt import Prompt
+
+    console = Console()
+    if args.mode is None:
+        console.print("[yellow]Выберите режим работы:[/yellow] \n 1: Создание схем \n 2: Создание аттестаций")
+        mode = Prompt.ask("Введите 1 или 2", choices=["1", "2"])
+        args.mode = "schemas" if mode == "1" else "attestations"
+
+    if args.chain is None:
+        console.print("[yellow]Выберите сеть: \n 1: BSC \n 2: opBNB \n 3: Polygon [/yellow]")
+        network_choice = Prompt.ask("Введите 1, 2 или 3", choices=["1", "2", "3"])
+        args.chain = [{"1": "bsc", "2": "opbnb", "3": "polygon"}[network_choice]]
+
+    names = ", ".join(CHAIN_NAMES[network] for network in args.chain)
+    console.print(f"\n✅ Выбран режим: [bold]{args.mode}[/bold], Сеть: [bold]{names}[/bold]\n")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    keys_range = (args.from_line, args.to_line)
+
+    failed = 0
+    for network in args.chain:
+        logger.info(f"Режим {args.mode}, сеть {CHAIN_NAMES[network]}")
+        if args.dry_run:
+            run_async(dry_run_keys(args.mode, network, keys_range, args.keys_file, resume=args.resume))
+        elif args.pipeline:
+            # Подпись и рассылка отдельными этапами, без логина в API
+            failed += run_async(run_pipeline_keys(args.mode, network, keys_range, args.pipeline, args.keys_file))
+        elif args.processes > 1:
+            from utils.process_runner import run_sharded
+
+            # Несколько процессов, у каждого свой event loop и свои потоки на своём куске файла ключей
+            totals = run_sharded(args.mode, network, keys_range, args.processes, args.threads,
+                                 path=args.keys_file, resume=args.resume) or {}
+            # Упавший процесс - тоже ошибка прогона: его ключи не доделаны
+            failed += totals.get("failed", 0) + totals.get("crashed", 0)
+        else:
+            snapshot = run_async(run_keys(args.mode, network, keys_range, args.threads,
+                                          resume=args.resume, path=args.keys_file))
+            failed += snapshot["failed"]
+
+    logger.success("Прогон окончен")
+    # Код возврата для cron/systemd: 1 - были недоделанные ключи, неподтверждённые транзакции конвейера
+    # или упал процесс-шард
+    return 1 if failed else 0
 
-    console.print("[bold green]Прогон окончен[/bold green]")
 
 if __name__ == "__main__":
-    asyncio.set_event_loop_policy(WindowsSelectorEventLoopPolicy())
-    asyncio.run(main())
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import hashlib
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from eth_account import Account
+
+from utils.key_loader import KEYS_PATH, KeyLoader, normalize_key
+from utils.logger import logger
+
+CACHE_SUFFIX = ".addresses"  # кэш "отпечаток ключа -> адрес" рядом с файлом ключей
+POOL_THRESHOLD = 5000  # с какого числа новых ключей считать адреса в нескольких процессах
+
+_book = None
+
+
+def fingerprint(key: str) -> str:
+    """Отпечаток ключа для кэша: по нему нельзя восстановить ключ"""
+    key = key.lower().removeprefix("0x")
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+def derive_address(key: str) -> str:
+    return Account.from_key(key).address
+
+
+def read_cache(path, wanted=None):
+    """Кэш адресов; wanted - множество отпечатков, остальные записи не держим в памяти"""
+    cache = {}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and (wanted is None or parts[0] in wanted):
+                    cache[parts[0]] = parts[1]
+    return cache
+
+
+def append_cache(path, entries):
+    # Один write с O_APPEND: процессы-шарды дописывают кэш одновременно, строки не перемешиваются
+    data = "".join(f"{fp} {address}\n" for fp, address in entries.items()).encode()
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+
+
+def derive_addresses(keys):
+    if len(keys) < POOL_THRESHOLD or (os.cpu_count() or 1) == 1:
+        return [derive_address(key) for key in keys]
+    with ProcessPoolExecutor() as executor:
+        chunksize = max(1, len(keys) // ((os.cpu_count() or 1) * 4))
+        return list(executor.map(derive_address, keys, chunksize=chunksize))
+
+
+class AddressBook:
+    """
+    Адреса всех ключей из файла, посчитанные один раз на старте. Случайный получатель - за O(1).
+    """
+    def __init__(self, addresses, by_fingerprint=None):
+        self.addresses = addresses
+        self.by_fingerprint = by_fingerprint or {}
+
+    def random(self) -> str:
+        if not self.addresses:
+            raise ValueError("Файл пуст или содержит только пустые строки")
+        return random.choice(self.addresses)
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def address_of(self, key: str) -> str:
+        """Адрес ключа из кэша, для ключа не из файла - посчитанный на месте"""
+        address = self.by_fingerprint.get(fingerprint(key))
+        return address if address is not None else derive_address(key)
+
+    def addresses_of(self, keys) -> list:
+        return [self.address_of(key) for key in keys]
+
+    @classmethod
+    def load(cls, path=KEYS_PATH):
+        keys = list(KeyLoader(path))
+
+        cache_path = path + CACHE_SUFFIX
+        cache = read_cache(cache_path)
+        fingerprints = [fingerprint(key) for key in keys]
+
+        missing = {fp: key for fp, key in zip(fingerprints, keys) if fp not in cache}
+        if missing:
+            logger.info(f"Считаю адреса для {len(missing)} новых ключей")
+            addresses = derive_addresses(list(missing.values()))
+            new_entries = dict(zip(missing, addresses))
+            cache.update(new_entries)
+            append_cache(cache_path, new_entries)
+
+        return cls([cache[fp] for fp in fingerprints], cache)
+
+
+class AddressCache:
+    """
+    Адреса ключей одного диапазона строк (шарда) без таблицы всего файла: из кэша берутся только записи
+    этого диапазона, недостающие адреса считаются пачками по мере надобности и дописываются в кэш.
+    Нужна там, где случайный получатель из всего файла не требуется (проверка балансов в режиме схем).
+    """
+    def __init__(self, path=KEYS_PATH, keys_range=(0, None)):
+        self.cache_path = path + CACHE_SUFFIX
+        start, stop = keys_range
+        with open(path, "r") as f:
+            keys = (normalize_key(line) for line in islice(f, start or 0, stop))
+            wanted = {fingerprint(key) for key in keys if key is not None}
+        self.known = read_cache(self.cache_path, wanted)
+
+    def addresses_of(self, keys) -> list:
+        fingerprints = [fingerprint(key) for key in keys]
+        missing = {fp: key for fp, key in zip(fingerprints, keys) if fp not in self.known}
+        if missing:
+            new_entries = dict(zip(missing, derive_addresses(list(missing.values()))))
+            self.known.update(new_entries)
+            append_cache(self.cache_path, new_entries)
+        return [self.known[fp] for fp in fingerprints]
+
+
+def get_address_book(path=KEYS_PATH) -> AddressBook:
+    global _book
+    if _book is None:
+        _book = AddressBook.load(path)
+    return _book
@@ -0,0 +1,83 @@
+import asyncio
+import os
+
+from utils.chain_context import get_chain_context
+from utils.key_loader import batched
+from utils.logger import logger
+
+BALANCE_BATCH = 50  # сколько адресов проверять одним batch-запросом: публичные ноды часто не принимают batch больше 50-100
+# Сколько газа закладывать на одну транзакцию при проверке баланса (с запасом к типичному register/attest)
+PREFLIGHT_GAS = {"schemas": 300_000, "attestations": 300_000}
+UNFUNDED_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "reports", "unfunded_keys.txt")
+
+
+async def required_balance(ctx, mode) -> int:
+    """Минимум в wei, чтобы ключ мог оплатить хотя бы одну транзакцию режима по текущей цене газа"""
+    fees = await ctx.gas.fees()
+    price = fees.get("maxFeePerGas", fees.get("gasPrice"))
+    return price * PREFLIGHT_GAS[mode]
+
+
+async def native_balances(ctx, addresses) -> list:
+    """Балансы адресов batch-запросами eth_getBalance; None - нода не ответила по адресу"""
+    balances = []
+    for chunk in batched(addresses, BALANCE_BATCH):
+        results = await ctx.batch.call([("eth_getBalance", [address, "latest"]) for address in chunk])
+        balances.extend(None if isinstance(result, Exception) else int(result, 16) for result in results)
+    return balances
+
+
+class BalanceScan:
+    """
+    Предварительная проверка: до логина и любых запросов по ключу отсеивает ключи, которым не хватает
+    на газ. Отсеянные ключи откладываются в reports/unfunded_keys.txt - их можно прогнать после пополнения.
+    """
+    def __init__(self, chain, mode, addresses, path=UNFUNDED_PATH):
+        # addresses - AddressBook или AddressCache диапазона: у обоих есть addresses_of(keys)
+        # path=None - ключи без денег только считаются, в файл не откладываются
+        self.ctx = get_chain_context(chain)
+        self.mode = mode
+        self.addresses = addresses
+        self.path = path
+        self.unfunded = 0
+
+    def defer(self, keys):
+        if self.path is None:
+            # Пробный прогон: только считаем, файл не трогаем
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a") as f:
+            f.writelines(f"{key}\n" for key in keys)
+
+    async def filter(self, items):
+        """Асинхронный генератор по WorkItem: пропускает дальше только ключи с балансом"""
+        try:
+            need = await required_balance(self.ctx, self.mode)
+        except Exception as err:
+            logger.warning(f"Не узнал цену газа, проверка балансов пропущена: {err}")
+            for item in items:
+                yield item
+            return
+
+        for chunk in batched(items, BALANCE_BATCH):
+            # Адреса не из кэша считаются долго (миллисекунды на ключ) - не на event loop
+            addresses = await asyncio.to_thread(self.addresses.addresses_of, [item.key for item in chunk])
+            try:
+                balances = await native_balances(self.ctx, addresses)
+            except Exception as err:
+                # Нода отклонила batch целиком или все ноды недоступны - пачка идёт дальше без проверки
+                logger.warning(f"Не получил балансы пачки из {len(chunk)} ключей, пропускаю её без проверки: {err}")
+                balances = [None] * len(chunk)
+
+            unfunded = []
+            for item, address, balance in zip(chunk, addresses, balances):
+                # Если нода не ответила по адресу - не отсеиваем, ключ проверится обычным путём
+                if balance is not None and balance < need:
+                    unfunded.append(item.key)
+                    logger.warning(f"{address} | Баланс {balance / 1e18:.6f} меньше нужного на газ, откладываю")
+                    continue
+                yield item
+
+            if unfunded:
+                self.unfunded += len(unfunded)
+                self.defer(unfunded)
@@ -0,0 +1,93 @@
+import json
+import os
+
+from eth_abi.abi import default_codec
+from eth_abi.encoding import TupleEncoder
+from eth_utils import function_abi_to_4byte_selector, get_abi_input_names, get_abi_input_types
+from web3 import AsyncWeb3
+from web3.middleware import async_geth_poa_middleware
+
+import config
+from constants.constants import rpc, contract_addresses, chain_ids
+from utils.endpoint_pool import EndpointPool, PoolProvider
+from utils.gas_estimator import GasEstimator
+from utils.gas_oracle import GasOracle
+from utils.nonce_manager import NonceManager
+from utils.receipt_tracker import ReceiptTracker
+from utils.rpc_batch import BatchRpc
+
+ABI_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "abis", "abi.json")
+
+# Кэш на весь процесс: одна сеть -> один провайдер, контракт и набор энкодеров
+_contexts = {}
+_abi = None
+
+
+def read_abi(path=ABI_PATH) -> list:
+    global _abi
+    if _abi is None:
+        with open(path, "r") as f:
+            _abi = json.load(f)
+    return _abi
+
+
+class FunctionEncoder:
+    """
+    Заранее собранный энкодер calldata для конкретной перегрузки функции контракта.
+    """
+    def __init__(self, fn_abi):
+        self.name = fn_abi["name"]
+        self.selector = function_abi_to_4byte_selector(fn_abi)
+        self.types = get_abi_input_types(fn_abi)
+        self.encoder = TupleEncoder(encoders=[default_codec._registry.get_encoder(t) for t in self.types])
+
+    def __call__(self, *args) -> bytes:
+        return self.selector + self.encoder(args)
+
+
+def find_function_abi(abi, name, input_names):
+    for item in abi:
+        if item.get("type") == "function" and item.get("name") == name \
+                and get_abi_input_names(item) == list(input_names):
+            return item
+    raise ValueError(f"Функция {name}({', '.join(input_names)}) не найдена в ABI")
+
+
+class ChainContext:
+    def __init__(self, chain):
+        self.chain = chain
+        self.chain_id = chain_ids.get(chain)
+        self.abi = read_abi()
+        # Все запросы сети (web3, батчи, квитанции) идут через один пул нод
+        self.pool = EndpointPool(rpc.get(chain), chain=chain)
+        self.w3 = AsyncWeb3(PoolProvider(self.pool))
+        self.w3.middleware_onion.inject(async_geth_poa_middleware, layer=0)
+        self.contract_address = AsyncWeb3.to_checksum_address(contract_addresses.get(chain))
+        self.contract = self.w3.eth.contract(address=self.contract_address, abi=self.abi)
+        self.nonces = NonceManager(self.w3)
+        self.batch = BatchRpc(self.pool)
+        self.receipts = ReceiptTracker(self.batch)
+        self.gas = GasOracle(self.w3, fixed_gwei=config.FIXED_GAS_PRICE.get(chain),
+                             eip1559=chain in config.EIP1559_CHAINS, ttl=config.GAS_PRICE_TTL)
+        self.estimates = GasEstimator(self.w3)
+
+        self.register = FunctionEncoder(find_function_abi(self.abi, "register", ["schema", "delegateSignature"]))
+        self.attest = FunctionEncoder(find_function_abi(
+            self.abi, "attest", ["attestation", "indexingKey", "delegateSignature", "extraData"]))
+
+    async def close(self):
+        await self.pool.close()
+
+
+def get_chain_context(chain) -> ChainContext:
+    context = _contexts.get(chain)
+    if context is None:
+        context = _contexts[chain] = ChainContext(chain)
+    return context
+
+
+async def close_chain_contexts():
+    for context in _contexts.values():
+        await context.close()
+    # Следующий прогон (другая сеть или новый event loop) получит свежие контексты
+    _contexts.clear()
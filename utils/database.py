@@ -1,15 +1,75 @@
+import asyncio
 import json
 import random
 
 import aiosqlite
 
+from utils.metrics import timed
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=10000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+)
+
+
+class SchemaIndex:
+    """
+    Схемы одной сети в памяти: случайная схема выбирается за O(1), без запроса в базу и без json.loads.
+    """
+    def __init__(self):
+        self.items = []  # [(schemaId, [поля схемы])]
+        self.ids = set()
+
+    def add(self, row_id, schema_id, fields):
+        if row_id in self.ids:
+            return
+        self.ids.add(row_id)
+        self.items.append((schema_id, fields))
+
+    def random(self):
+        if not self.items:
+            return None
+        return random.choice(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
 
 class Database:
+    """
+    Одно долгоживущее соединение на весь прогон: открывается в initialize_db, закрывается в close.
+    Все запросы потоков идут через него, поэтому нет ни затрат на connect, ни 'database is locked'.
+    """
     def __init__(self, db_name="schemas.db"):
         self.db_name = db_name
+        self.db = None
+        self.write_lock = asyncio.Lock()
+        self.schema_index = {}
+
+    async def __aenter__(self):
+        await self.initialize_db()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self.db is not None:
+            await self.db.close()
+            self.db = None
 
     async def initialize_db(self):
-        async with aiosqlite.connect(self.db_name) as db:
+        if self.db is None:
+            # cached_statements: sqlite3 держит подготовленные запросы в кэше соединения
+            self.db = await aiosqlite.connect(self.db_name, cached_statements=256)
+            for pragma in PRAGMAS:
+                await self.db.execute(pragma)
+
+        db = self.db
+        async with self.write_lock:
             for chain in ["bsc", "opbnb", "polygon"]:
                 await db.execute(f"""
                     CREATE TABLE IF NOT EXISTS {chain}_schemas (
@@ -31,45 +91,224 @@ class Database:
                         originalData TEXT
                     )
                 """)
+
+            # Очередь подписанных транзакций конвейера: подписали -> отправили -> подтвердились/упали
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS signed_transactions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chain TEXT,
+                    mode TEXT,
+                    address TEXT,
+                    nonce INTEGER,
+                    raw BLOB,
+                    transactionHash TEXT UNIQUE,
+                    status TEXT
+                )
+            """)
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS signed_transactions_status ON signed_transactions (chain, status, id)")
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS signed_transactions_address ON signed_transactions (chain, address)")
+
+            # Журнал прогона: что уже сделано по каждому ключу в режиме и сети. Ключ хранится отпечатком
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS journal (
+                    fingerprint TEXT,
+                    mode TEXT,
+                    chain TEXT,
+                    address TEXT,
+                    state TEXT,
+                    target INTEGER,
+                    updated INTEGER,
+                    PRIMARY KEY (fingerprint, mode, chain)
+                )
+            """)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS journal_transactions (
+                    transactionHash TEXT PRIMARY KEY,
+                    fingerprint TEXT,
+                    mode TEXT,
+                    chain TEXT,
+                    status TEXT
+                )
+            """)
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS journal_transactions_key ON journal_transactions (fingerprint, mode, chain)")
             await db.commit()
 
-    async def schema_exists(self, schema_id, chain):
-        async with aiosqlite.connect(self.db_name) as db:
-            async with db.execute(f"SELECT 1 FROM {chain}_schemas WHERE id = ?", (schema_id,)) as cursor:
-                return await cursor.fetchone() is not None
+    @staticmethod
+    def schema_row(schema):
+        return (
+            schema["id"], schema["mode"], schema["chainType"], schema["chainId"], schema["schemaId"],
+            schema["transactionHash"], schema["name"], schema["description"], schema["dataLocation"],
+            schema["revocable"], schema["maxValidFor"], schema["resolver"],
+            schema["registerTimestamp"], schema["registrant"],
+            json.dumps(schema["data"]),  # Сохраняем data как JSON
+            schema["originalData"]
+        )
 
     async def insert_schema(self, schema, chain):
-        async with aiosqlite.connect(self.db_name) as db:
-            await db.execute(f"""
-                INSERT INTO {chain}_schemas (
+        await self.upsert_schemas([schema], chain)
+
+    @timed("db")
+    async def upsert_schemas(self, schemas, chain):
+        """
+        Пишет пачку схем одной транзакцией, уже существующие пропускаются. Возвращает число новых строк.
+        """
+        schemas = list(schemas)
+        if not schemas:
+            return 0
+
+        db = self.db
+        async with self.write_lock:
+            changes_before = db.total_changes
+            await db.executemany(f"""
+                INSERT OR IGNORE INTO {chain}_schemas (
                     id, mode, chainType, chainId, schemaId, transactionHash, name, description,
                     dataLocation, revocable, maxValidFor, resolver, registerTimestamp, registrant, data, originalData
                 ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                schema["id"], schema["mode"], schema["chainType"], schema["chainId"], schema["schemaId"],
-                schema["transactionHash"], schema["name"], schema["description"], schema["dataLocation"],
-                schema["revocable"], schema["maxValidFor"], schema["resolver"],
-                schema["registerTimestamp"], schema["registrant"],
-                json.dumps(schema["data"]),  # Сохраняем data как JSON
-                schema["originalData"]
-            ))
+            """, [self.schema_row(schema) for schema in schemas])
             await db.commit()
+            inserted = db.total_changes - changes_before
+
+        index = self.schema_index.get(chain)
+        if index is not None:
+            for schema in schemas:
+                index.add(schema["id"], schema["schemaId"], schema["data"])
+        return inserted
+
+    @timed("db")
+    async def get_index(self, chain) -> SchemaIndex:
+        """
+        Загружает схемы сети в память один раз, дальше индекс обновляется в insert_schema.
+        """
+        index = self.schema_index.get(chain)
+        if index is not None:
+            return index
+
+        # Под write_lock, чтобы параллельная insert_schema не проскочила между SELECT и публикацией индекса
+        async with self.write_lock:
+            index = self.schema_index.get(chain)
+            if index is None:
+                index = SchemaIndex()
+                async with self.db.execute(f"SELECT id, schemaId, data FROM {chain}_schemas") as cursor:
+                    async for row_id, schema_id, data in cursor:
+                        index.add(row_id, schema_id, json.loads(data))
+                self.schema_index[chain] = index
+        return index
+
+    @timed("db")
+    async def enqueue_signed(self, rows):
+        """rows: [(chain, mode, address, nonce, raw, transactionHash)]"""
+        async with self.write_lock:
+            await self.db.executemany("""
+                INSERT OR IGNORE INTO signed_transactions (chain, mode, address, nonce, raw, transactionHash, status)
+                VALUES (?, ?, ?, ?, ?, ?, 'signed')
+            """, rows)
+            await self.db.commit()
+
+    @timed("db")
+    async def get_signed(self, chain, statuses=("signed", "sent")):
+        """Транзакции из очереди в порядке подписи: [(id, mode, address, nonce, raw, transactionHash, status)]"""
+        placeholders = ", ".join("?" * len(statuses))
+        async with self.db.execute(f"""
+            SELECT id, mode, address, nonce, raw, transactionHash, status FROM signed_transactions
+            WHERE chain = ? AND status IN ({placeholders}) ORDER BY id
+        """, (chain, *statuses)) as cursor:
+            return await cursor.fetchall()
+
+    @timed("db")
+    async def get_queued_addresses(self, chain, addresses) -> set:
+        """Адреса из списка, у которых в очереди есть ещё не разосланные или не подтверждённые транзакции"""
+        placeholders = ", ".join("?" * len(addresses))
+        async with self.db.execute(f"""
+            SELECT DISTINCT address FROM signed_transactions
+            WHERE chain = ? AND address IN ({placeholders}) AND status IN ('signed', 'sent')
+        """, (chain, *addresses)) as cursor:
+            return {row[0] for row in await cursor.fetchall()}
 
-    async def get_random_schema_id(self, chain):
-        async with aiosqlite.connect(self.db_name) as db:
-            async with db.execute(f"SELECT schemaId FROM {chain}_schemas") as cursor:
-                rows = await cursor.fetchall()
-                if not rows:
-                    return None
-                return random.choice(rows)[0]
-
-    async def get_schema_data_by_id(self, schema_id, chain):
-        async with aiosqlite.connect(self.db_name) as db:
-            cursor = await db.execute(f"SELECT data FROM {chain}_schemas WHERE schemaId = ?", (schema_id,))
+    @timed("db")
+    async def set_signed_status(self, tx_hash, status):
+        async with self.write_lock:
+            await self.db.execute(
+                "UPDATE signed_transactions SET status = ? WHERE transactionHash = ?", (status, tx_hash))
+            await self.db.commit()
+
+    @timed("db")
+    async def get_journal(self, fingerprint, mode, chain):
+        """
+        Запись журнала по ключу или None: {state, target, confirmed, pending: [хэши без квитанции]}
+        """
+        async with self.db.execute(
+                "SELECT state, target FROM journal WHERE fingerprint = ? AND mode = ? AND chain = ?",
+                (fingerprint, mode, chain)) as cursor:
             row = await cursor.fetchone()
-            await cursor.close()
-            if row:
-                data = row[0]
-                return data
-            else:
-                return None
\ No newline at end of file
+        if row is None:
+            return None
+
+        entry = {"state": row[0], "target": row[1], "confirmed": 0, "pending": []}
+        async with self.db.execute(
+                "SELECT transactionHash, status FROM journal_transactions WHERE fingerprint = ? AND mode = ? AND chain = ?",
+                (fingerprint, mode, chain)) as cursor:
+            async for tx_hash, status in cursor:
+                if status == "confirmed":
+                    entry["confirmed"] += 1
+                elif status == "pending":
+                    entry["pending"].append(tx_hash)
+        return entry
+
+    @timed("db")
+    async def get_journal_done(self, mode, chain) -> set:
+        """Отпечатки ключей, по которым режим в сети уже полностью отработал"""
+        async with self.db.execute(
+                "SELECT fingerprint FROM journal WHERE mode = ? AND chain = ? AND state = 'done'", (mode, chain)) as cursor:
+            return {row[0] for row in await cursor.fetchall()}
+
+    @timed("db")
+    async def set_journal(self, fingerprint, mode, chain, address, state, target=None):
+        async with self.write_lock:
+            await self.db.execute("""
+                INSERT INTO journal (fingerprint, mode, chain, address, state, target, updated)
+                VALUES (?, ?, ?, ?, ?, ?, strftime('%s', 'now'))
+                ON CONFLICT (fingerprint, mode, chain) DO UPDATE SET
+                    state = excluded.state,
+                    target = COALESCE(excluded.target, journal.target),
+                    updated = excluded.updated
+            """, (fingerprint, mode, chain, address, state, target))
+            await self.db.commit()
+
+    @timed("db")
+    async def start_journal(self, fingerprint, mode, chain, address, target):
+        """Новый прогон ключа: транзакции прошлых прогонов в журнале больше не засчитываются"""
+        async with self.write_lock:
+            await self.db.execute(
+                "DELETE FROM journal_transactions WHERE fingerprint = ? AND mode = ? AND chain = ?",
+                (fingerprint, mode, chain))
+            await self.db.execute("""
+                INSERT INTO journal (fingerprint, mode, chain, address, state, target, updated)
+                VALUES (?, ?, ?, ?, 'started', ?, strftime('%s', 'now'))
+                ON CONFLICT (fingerprint, mode, chain) DO UPDATE SET
+                    state = excluded.state,
+                    target = excluded.target,
+                    updated = excluded.updated
+            """, (fingerprint, mode, chain, address, target))
+            await self.db.commit()
+
+    @timed("db")
+    async def set_journal_transaction(self, tx_hash, fingerprint, mode, chain, status):
+        """status: pending - отправлена, confirmed/failed - по квитанции, dropped - квитанции нет и после перепроверки"""
+        async with self.write_lock:
+            await self.db.execute("""
+                INSERT INTO journal_transactions (transactionHash, fingerprint, mode, chain, status)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (transactionHash) DO UPDATE SET status = excluded.status
+            """, (tx_hash, fingerprint, mode, chain, status))
+            await self.db.commit()
+
+    @timed("db")
+    async def get_random_schema(self, chain):
+        """
+        Возвращает случайную пару (schemaId, список полей) или None, если схем в сети нет.
+        """
+        index = await self.get_index(chain)
+        return index.random()
@@ -0,0 +1,195 @@
+import asyncio
+import time
+
+import aiohttp
+from web3.providers.async_base import AsyncJSONBaseProvider
+
+from utils.logger import logger
+from utils.metrics import timer
+
+PROBE_INTERVAL = 15  # как часто проверять все ноды через eth_blockNumber, секунд
+FAILURES_TO_EJECT = 3  # после скольких ошибок подряд нода выводится из ротации до успешной проверки
+LAG_BLOCKS = 5  # на сколько блоков нода может отставать от лучшей, чтобы считаться живой
+EWMA_ALPHA = 0.3  # вес последнего замера в скользящей задержке
+HEDGE_MIN_DELAY = 0.3  # раньше этого читающий запрос на вторую ноду не дублируется, секунд
+HEDGE_FACTOR = 3  # дублируем, если нода отвечает дольше своей обычной задержки в столько раз
+
+# Только чтение: такие запросы можно безопасно дублировать на вторую ноду
+HEDGE_METHODS = {
+    "eth_blockNumber", "eth_call", "eth_chainId", "eth_estimateGas", "eth_feeHistory", "eth_gasPrice",
+    "eth_getBalance", "eth_getBlockByNumber", "eth_getTransactionCount", "eth_getTransactionReceipt",
+    "eth_maxPriorityFeePerGas", "net_version",
+}
+# Не меняются за время жизни процесса - спрашиваем ноду один раз
+CACHED_METHODS = {"eth_chainId", "net_version"}
+
+TRANSPORT_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ValueError)
+
+
+class Endpoint:
+    def __init__(self, url):
+        self.url = url
+        self.latency = None  # скользящая средняя, секунд
+        self.failures = 0
+        self.healthy = True
+        self.block = None
+        self.requests = 0
+        self.errors = 0
+
+    def score(self) -> float:
+        # Ноду без замеров пробуем с оптимистичной оценкой, чтобы она получила шанс
+        return self.latency if self.latency is not None else HEDGE_MIN_DELAY
+
+    def success(self, elapsed):
+        self.requests += 1
+        self.failures = 0
+        self.healthy = True
+        self.latency = elapsed if self.latency is None else EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * self.latency
+
+    def failure(self, err):
+        self.requests += 1
+        self.errors += 1
+        self.failures += 1
+        if self.failures >= FAILURES_TO_EJECT and self.healthy:
+            self.healthy = False
+            logger.warning(f"RPC {self.url} выведена из ротации: {err}")
+
+
+class EndpointPool:
+    """
+    Несколько RPC одной сети. Каждый запрос идёт на самую быструю живую ноду по скользящей задержке;
+    читающий запрос, на который нода долго не отвечает, дублируется на следующую (hedging),
+    при ошибке транспорта запрос уходит на следующую ноду. Фоновая проверка раз в PROBE_INTERVAL
+    обновляет задержки, выводит из ротации отстающие ноды и возвращает ожившие.
+    """
+    def __init__(self, urls, timeout=30, probe_interval=PROBE_INTERVAL, chain=""):
+        if isinstance(urls, str):
+            urls = [urls]
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.chain = chain
+        self.timeout = timeout
+        self.probe_interval = probe_interval
+        self.session = None
+        self.prober = None
+
+    async def get_session(self):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        if self.prober is None and len(self.endpoints) > 1:
+            self.prober = asyncio.create_task(self.probe())
+        return self.session
+
+    def ranked(self) -> list:
+        healthy = [endpoint for endpoint in self.endpoints if endpoint.healthy]
+        # Если выпали все - пробуем все, лучше медленный ответ, чем никакого
+        return sorted(healthy or self.endpoints, key=Endpoint.score)
+
+    @staticmethod
+    def hedge_delay(endpoint) -> float:
+        return max(HEDGE_MIN_DELAY, endpoint.score() * HEDGE_FACTOR)
+
+    async def send(self, endpoint, body: bytes):
+        session = await self.get_session()
+        started = time.perf_counter()
+        try:
+            with timer("rpc", self.chain, endpoint.url):
+                async with session.post(endpoint.url, data=body, headers={"Content-Type": "application/json"}) as response:
+                    response.raise_for_status()
+                    data = await response.json(content_type=None)
+        except TRANSPORT_ERRORS as err:
+            endpoint.failure(err)
+            raise
+        endpoint.success(time.perf_counter() - started)
+        return data
+
+    async def post(self, body: bytes, hedge=False):
+        """
+        Отправляет JSON-RPC запрос (одиночный или batch) и возвращает разобранный ответ.
+        Ответы с полем error - это ответ ноды, они возвращаются как есть; исключение - только если
+        не ответила ни одна нода.
+        """
+        candidates = iter(self.ranked())
+        pending = set()
+        last_error = None
+
+        def launch():
+            endpoint = next(candidates, None)
+            if endpoint is not None:
+                pending.add(asyncio.ensure_future(self.send(endpoint, body)))
+            return endpoint
+
+        current = launch()
+        try:
+            while pending:
+                timeout = self.hedge_delay(current) if hedge else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Нода медлит: дублируем запрос на следующую, ответ возьмём от того, кто успеет первым
+                    endpoint = launch()
+                    if endpoint is None:
+                        hedge = False  # дублировать больше некуда, просто ждём
+                    else:
+                        current = endpoint
+                    continue
+
+                for task in done:
+                    pending.discard(task)
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+                if not pending:
+                    current = launch() or current
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def probe_one(self, endpoint):
+        try:
+            data = await self.send(endpoint, b'{"jsonrpc": "2.0", "id": 0, "method": "eth_blockNumber", "params": []}')
+            endpoint.block = int(data["result"], 16)
+        except Exception:
+            endpoint.block = None
+
+    async def probe(self):
+        while True:
+            await asyncio.gather(*(self.probe_one(endpoint) for endpoint in self.endpoints))
+            top = max((endpoint.block for endpoint in self.endpoints if endpoint.block is not None), default=None)
+            for endpoint in self.endpoints:
+                if top is not None and endpoint.block is not None and top - endpoint.block > LAG_BLOCKS:
+                    if endpoint.healthy:
+                        logger.warning(f"RPC {endpoint.url} отстаёт на {top - endpoint.block} блоков, вывожу из ротации")
+                    endpoint.healthy = False
+            await asyncio.sleep(self.probe_interval)
+
+    def summary(self) -> str:
+        parts = []
+        for endpoint in self.ranked():
+            latency = f"{endpoint.latency * 1000:.0f} мс" if endpoint.latency is not None else "нет замеров"
+            parts.append(f"{endpoint.url}: {latency}, запросов {endpoint.requests}, ошибок {endpoint.errors}")
+        return "RPC: " + "; ".join(parts)
+
+    async def close(self):
+        if self.prober is not None:
+            self.prober.cancel()
+            self.prober = None
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class PoolProvider(AsyncJSONBaseProvider):
+    """Провайдер web3 поверх EndpointPool: все запросы AsyncWeb3 идут через пул нод"""
+    def __init__(self, pool: EndpointPool):
+        super().__init__()
+        self.pool = pool
+        self.cached = {}
+
+    async def make_request(self, method, params):
+        if method in self.cached:
+            return self.cached[method]
+
+        response = await self.pool.post(self.encode_rpc_request(method, params), hedge=method in HEDGE_METHODS)
+        if method in CACHED_METHODS and "result" in response:
+            self.cached[method] = response
+        return response
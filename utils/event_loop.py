@@ -0,0 +1,29 @@
+import asyncio
+import sys
+
+import config
+
+
+def setup_event_loop():
+    """
+    Политика event loop под платформу. Windows: selector loop - curl_cffi и aiohttp не работают с proactor.
+    Linux/macOS: uvloop, если он установлен и не выключен в config, иначе стандартный loop.
+    """
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+        return "selector"
+
+    if config.USE_UVLOOP:
+        try:
+            import uvloop
+        except ImportError:
+            return "asyncio"
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        return "uvloop"
+    return "asyncio"
+
+
+def run_async(coro):
+    """asyncio.run с политикой loop под платформу - единая точка входа для main и процессов-шардов"""
+    setup_event_loop()
+    return asyncio.run(coro)
@@ -0,0 +1,47 @@
+ESTIMATE_MARGIN = 1.05  # запас к свежей оценке, как и раньше
+CACHED_ESTIMATE_MARGIN = 1.2  # запас к оценке из кэша: calldata той же формы, но не та же самая
+LENGTH_BUCKET = 64  # шаг округления длины calldata, байт (два слова ABI)
+
+
+class GasEstimator:
+    """
+    Кэш оценок газа одной сети по форме вызова: функция, форма схемы и длина calldata с шагом LENGTH_BUCKET.
+    Промах кэша или упавшая транзакция с газом из кэша - честный estimate_gas.
+    """
+    def __init__(self, w3, margin=ESTIMATE_MARGIN, cached_margin=CACHED_ESTIMATE_MARGIN):
+        self.w3 = w3
+        self.margin = margin
+        self.cached_margin = cached_margin
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def key(function, shape, data):
+        return function, shape, len(data) // LENGTH_BUCKET
+
+    async def estimate(self, transaction, function, shape=None):
+        """Возвращает (gas, key, из_кэша)"""
+        key = self.key(function, shape, transaction['data'])
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            return int(cached * self.cached_margin), key, True
+
+        self.misses += 1
+        estimated_gas = await self.w3.eth.estimate_gas(transaction)
+        self.cache[key] = max(estimated_gas, self.cache.get(key, 0))
+        return int(estimated_gas * self.margin), key, False
+
+    def invalidate(self, key):
+        """Транзакция с газом из кэша не прошла - следующая с такой формой снова спросит ноду"""
+        if self.cache.pop(key, None) is not None:
+            self.fallbacks += 1
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        if not total:
+            return "оценок газа не было"
+        return (f"оценка газа: {total} запросов, из кэша {self.hits / total:.0%}, "
+                f"откатов на estimate_gas после неудачи {self.fallbacks / total:.0%}")
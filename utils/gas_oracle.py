@@ -0,0 +1,60 @@
+import asyncio
+import statistics
+import time
+
+from web3 import AsyncWeb3
+
+FEE_HISTORY_BLOCKS = 5
+FEE_HISTORY_PERCENTILE = 50
+
+
+class GasOracle:
+    """
+    Цена газа одной сети с коротким кэшем. Пока идёт обновление, остальные потоки ждут его же,
+    так что к ноде в каждый момент летит не больше одного запроса цены.
+
+    fixed_gwei - фиксированная цена (так делаем в BSC), eip1559 - комиссия транзакции типа 2 по eth_feeHistory.
+    """
+    def __init__(self, w3, fixed_gwei=None, eip1559=False, ttl=5):
+        self.w3 = w3
+        self.fixed_gwei = fixed_gwei
+        self.eip1559 = eip1559
+        self.ttl = ttl
+        self.cached = None
+        self.expires = 0
+        self.refresh_task = None
+
+    async def fees(self) -> dict:
+        """Поля комиссии для транзакции: gasPrice или maxFeePerGas/maxPriorityFeePerGas"""
+        if self.fixed_gwei is not None:
+            return {'gasPrice': AsyncWeb3.to_wei(self.fixed_gwei, 'gwei')}
+
+        if self.cached is not None and time.monotonic() < self.expires:
+            return dict(self.cached)
+
+        if self.refresh_task is None:
+            self.refresh_task = asyncio.ensure_future(self.refresh())
+        # shield: отмена одного ожидающего не должна обрывать обновление для остальных
+        return dict(await asyncio.shield(self.refresh_task))
+
+    async def refresh(self):
+        try:
+            fees = await (self.fetch_eip1559() if self.eip1559 else self.fetch_legacy())
+            self.cached = fees
+            self.expires = time.monotonic() + self.ttl
+            return fees
+        finally:
+            self.refresh_task = None
+
+    async def fetch_legacy(self):
+        return {'gasPrice': await self.w3.eth.gas_price}
+
+    async def fetch_eip1559(self):
+        history = await self.w3.eth.fee_history(FEE_HISTORY_BLOCKS, 'latest', [FEE_HISTORY_PERCENTILE])
+        base_fee = history['baseFeePerGas'][-1]  # базовая комиссия следующего блока
+        rewards = [reward[0] for reward in history.get('reward') or [] if reward]
+        priority_fee = int(statistics.median(rewards)) if rewards else 0
+        return {
+            'maxPriorityFeePerGas': priority_fee,
+            'maxFeePerGas': base_fee * 2 + priority_fee,
+        }
@@ -0,0 +1,83 @@
+from curl_cffi._wrapper import ffi
+from curl_cffi.aio import AsyncCurl
+from curl_cffi.const import CurlMOpt
+from curl_cffi.requests import AsyncSession, Cookies
+
+import config
+
+_transports = {}
+
+
+class SharedSession(AsyncSession):
+    """
+    Один curl multi-handle на весь процесс: соединения (keep-alive, HTTP/2 у chrome-профиля) и TLS-сессии
+    переиспользуются всеми аккаунтами. Cookies сюда не складываются - они отдаются в ответе и живут у аккаунта.
+    """
+    def __init__(self, max_per_host=None, **kwargs):
+        super().__init__(**kwargs)
+        self.max_per_host = max_per_host
+
+    @property
+    def acurl(self):
+        if self._acurl is None:
+            self._acurl = AsyncCurl(loop=self.loop)
+            if self.max_per_host:
+                # Обёртка curl_cffi объявляет значение как void*, числовую опцию передаём приведением
+                self._acurl.setopt(CurlMOpt.MAX_HOST_CONNECTIONS, ffi.cast("void *", self.max_per_host))
+        return self._acurl
+
+    def _parse_response(self, curl, buffer, header_buffer, default_encoding):
+        # Родитель кладёт cookies ответа в общий jar сессии. Забираем их в ответ и очищаем jar
+        # в том же синхронном участке - до следующего запроса другого аккаунта jar снова пуст
+        response = super()._parse_response(curl, buffer, header_buffer, default_encoding)
+        response.cookies = Cookies(self.cookies)
+        self.cookies.clear()
+        return response
+
+
+class AccountSession:
+    """
+    Сессия одного аккаунта поверх общего транспорта: свои заголовки и свой cookie jar,
+    соединения общие. Интерфейс get/post/close как у AsyncSession.
+    """
+    def __init__(self, transport: SharedSession, headers=None):
+        self.transport = transport
+        self.headers = headers or {}
+        self.cookies = Cookies()
+
+    async def request(self, method, url, **kwargs):
+        response = await self.transport.request(method, url, headers=self.headers, cookies=self.cookies, **kwargs)
+        self.cookies.update(response.cookies)
+        return response
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def close(self):
+        # Соединения принадлежат транспорту, у аккаунта остаётся только его состояние
+        self.cookies.clear()
+
+
+def get_transport() -> SharedSession:
+    """Общий транспорт процесса (свой на каждый прокси), создаётся при первом запросе"""
+    proxy = config.PROXY if config.USE_PROXY else None
+    transport = _transports.get(proxy)
+    if transport is None:
+        transport = _transports[proxy] = SharedSession(
+            proxies={'http': proxy, 'https': proxy} if proxy else None,
+            impersonate="chrome110",
+            verify=False,
+            trust_env=True,
+            max_clients=config.HTTP_MAX_CLIENTS,
+            max_per_host=config.HTTP_MAX_PER_HOST,
+        )
+    return transport
+
+
+async def close_transports():
+    for transport in _transports.values():
+        await transport.close()
+    _transports.clear()
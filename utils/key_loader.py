@@ -0,0 +1,77 @@
+import hashlib
+import os
+import re
+from itertools import islice
+
+from utils.logger import logger
+
+KEYS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "private_keys.txt")
+KEY_RE = re.compile(r"^(0x)?[0-9a-fA-F]{64}$")
+
+
+def normalize_key(line: str):
+    """Ключ в виде 0x + 64 hex в нижнем регистре или None, если строка не похожа на приватный ключ"""
+    key = line.strip()
+    if not KEY_RE.match(key):
+        return None
+    return "0x" + key[-64:].lower()
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def count_lines(path, chunk_size=1 << 20) -> int:
+    """Считает строки без декодирования и без загрузки файла в память"""
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            lines += chunk.count(b"\n")
+            last = chunk[-1:]
+    return lines + (last != b"\n")
+
+
+class KeyLoader:
+    """
+    Потоковое чтение файла ключей: один проход, проверка формата и дубликатов на лету,
+    ключи отдаются по одному. start/stop - диапазон номеров строк (шард файла), stop не включается.
+    """
+    def __init__(self, path, start=0, stop=None, dedupe=True):
+        self.path = path
+        self.start = start or 0
+        self.stop = stop
+        self.dedupe = dedupe
+        self.invalid = 0
+        self.duplicates = 0
+
+    def count(self) -> int:
+        """Верхняя оценка числа ключей в диапазоне (пустые и битые строки тоже считаются)"""
+        total = count_lines(self.path)
+        stop = total if self.stop is None else min(self.stop, total)
+        return max(0, stop - self.start)
+
+    def __iter__(self):
+        # В seen лежат 8-байтные хэши ключей, а не сами ключи
+        seen = set()
+        with open(self.path, "r") as f:
+            for line_number, line in enumerate(islice(f, self.start, self.stop), start=self.start + 1):
+                if not line.strip():
+                    continue
+
+                key = normalize_key(line)
+                if key is None:
+                    self.invalid += 1
+                    logger.warning(f"Строка {line_number} файла ключей не похожа на приватный ключ, пропускаю")
+                    continue
+
+                if self.dedupe:
+                    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+                    if digest in seen:
+                        self.duplicates += 1
+                        continue
+                    seen.add(digest)
+
+                yield key
@@ -1,7 +1,83 @@
+import json
+import multiprocessing
+import queue
 import sys
-import re
+import threading
 
 from loguru import logger
+from loguru._file_sink import FileSink
+
+import config
+
+# Поля контекста для JSON-лога: задаются через logger.contextualize(...) в потоке ключа и при отслеживании транзакции
+CONTEXT_FIELDS = ("thread", "address", "chain", "tx_hash")
+
+
+class BackgroundSink:
+    """
+    Запись в sink из отдельного потока: вызывающий только кладёт готовую строку в очередь.
+    enqueue=True у loguru идёт через межпроцессный канал: когда его буфер заполнен (ротация со сжатием,
+    медленная консоль), logger.info снова ждёт записи. Здесь очередь в памяти процесса и без ограничения.
+    """
+    def __init__(self, sink, name):
+        self.sink = sink
+        # Не публичный flush: loguru вызывает flush у sink после каждой записи в вызывающем потоке
+        self._flush = getattr(sink, "flush", None)
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.run, name=f"log-{name}", daemon=True)
+        self.thread.start()
+
+    def write(self, message):
+        self.queue.put(message)
+
+    def run(self):
+        while (message := self.queue.get()) is not None:
+            try:
+                self.sink.write(message)
+                if self._flush is not None:
+                    self._flush()
+            except Exception as err:
+                sys.stderr.write(f"Ошибка записи лога: {err}\n")
+
+    def stop(self):
+        # loguru вызывает stop при удалении обработчика (и при выходе): дописываем очередь до конца
+        self.queue.put(None)
+        self.thread.join()
+        if hasattr(self.sink, "stop"):
+            self.sink.stop()
+
+
+def log_name(extension) -> str:
+    # У процессов-шардов свои файлы: ротация одного файла из нескольких процессов небезопасна
+    name = multiprocessing.current_process().name
+    suffix = "" if name == "MainProcess" else f"-{name}"
+    return f"out{suffix}.{extension}"
+
+
+def json_format(record) -> str:
+    """Одна запись - одна строка JSON, поля контекста отдельными ключами"""
+    entry = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "message": record["message"],
+        "where": f"{record['name']}:{record['function']}:{record['line']}",
+    }
+    for field in CONTEXT_FIELDS:
+        value = record["extra"].get(field)
+        if value is not None:
+            entry[field] = value
+    if record["exception"] is not None:
+        entry["exception"] = repr(record["exception"].value)
+    record["extra"]["json"] = json.dumps(entry, ensure_ascii=False, default=str)
+    return "{extra[json]}\n"
+
+
+def file_sink(path):
+    """Файл с ротацией и сжатием; в фоновом режиме - за потоком записи"""
+    # delay: файл создаётся при первой записи - процессы пула подписи без логов файлов не заводят
+    sink = FileSink(path, rotation=config.LOG_ROTATION, retention=config.LOG_RETENTION,
+                    compression=config.LOG_COMPRESSION, delay=True, encoding="utf-8")
+    return BackgroundSink(sink, path) if config.LOG_ENQUEUE else sink
 
 
 def logging_setup():
@@ -13,18 +89,14 @@ def logging_setup():
 
     logger.remove()
 
-    logger.add(file_path + "out.log", colorize=True,
-               format=clean_brackets(format_error))
-
-    logger.add(sys.stdout, colorize=True,
-               format=format_info, level="INFO")
-
+    # В файле без цвета: теги разметки loguru убирает сам при colorize=False
+    logger.add(file_sink(file_path + log_name("log")), colorize=False, format=format_error)
 
-def clean_brackets(raw_str):
-    clean_text = re.sub(brackets_regex, '', raw_str)
-    return clean_text
+    if config.LOG_JSON:
+        logger.add(file_sink(file_path + log_name("jsonl")), colorize=False, format=json_format)
 
+    stdout = BackgroundSink(sys.stdout, "stdout") if config.LOG_ENQUEUE else sys.stdout
+    logger.add(stdout, colorize=True, format=format_info, level="INFO")
 
-brackets_regex = re.compile(r'<.*?>')
 
-logging_setup()
\ No newline at end of file
+logging_setup()
@@ -0,0 +1,262 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+from utils.logger import logger
+
+SUB_BUCKET_BITS = 5  # точность гистограммы: значения округляются вниз до 5 старших бит, ошибка не больше ~6%
+QUANTILES = (0.5, 0.9, 0.99)
+METRICS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "reports")
+PREFIX = "signglobal"
+
+# (этап, сеть, эндпоинт) -> Stage, на процесс
+_stages = {}
+_console = None
+_server = None
+_started = time.monotonic()
+
+
+class Histogram:
+    """
+    Гистограмма задержек в стиле HDR: значение в микросекундах округляется вниз до SUB_BUCKET_BITS старших бит,
+    поэтому корзин - десятки на порядок величины, а запись - одна операция со словарём.
+    """
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        micros = int(seconds * 1_000_000)
+        shift = max(0, micros.bit_length() - SUB_BUCKET_BITS)
+        bucket = micros >> shift << shift
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantiles(self, qs=QUANTILES) -> list:
+        """Значения квантилей в секундах (по нижней границе корзины)"""
+        if not self.count:
+            return [0.0] * len(qs)
+        result = []
+        buckets = sorted(self.counts.items())
+        position, seen = 0, 0
+        for q in qs:
+            rank = q * self.count
+            while position < len(buckets) - 1 and seen + buckets[position][1] < rank:
+                seen += buckets[position][1]
+                position += 1
+            result.append(buckets[position][0] / 1_000_000)
+        return result
+
+
+class Stage:
+    """Метрики одного этапа: гистограмма задержек, успехи/ошибки и сколько вызовов выполняется прямо сейчас"""
+    def __init__(self, name, chain="", endpoint=""):
+        self.name = name
+        self.chain = chain
+        self.endpoint = endpoint
+        self.histogram = Histogram()
+        self.ok = 0
+        self.failed = 0
+        self.in_flight = 0
+
+    def observe(self, seconds, ok=True):
+        self.histogram.record(seconds)
+        if ok:
+            self.ok += 1
+        else:
+            self.failed += 1
+
+
+class Timer:
+    """with timer(...): - засекает время блока (в том числе с await внутри), исключение считается ошибкой"""
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.stage.in_flight += 1
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stage.in_flight -= 1
+        if exc_type is asyncio.CancelledError:
+            # Отменённый вызов (проигравший дубль запроса, Ctrl+C) - не ошибка и не замер
+            return False
+        self.stage.observe(time.perf_counter() - self.started, exc_type is None)
+        return False
+
+
+def get_stage(name, chain="", endpoint="") -> Stage:
+    key = (name, chain, endpoint)
+    stage = _stages.get(key)
+    if stage is None:
+        stage = _stages[key] = Stage(name, chain, endpoint)
+    return stage
+
+
+def timer(name, chain="", endpoint="") -> Timer:
+    return Timer(get_stage(name, chain, endpoint))
+
+
+def timed(name):
+    """Декоратор async-метода: этап name, эндпоинт - имя метода (для запросов к базе)"""
+    def decorator(func):
+        stage_endpoint = func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with timer(name, endpoint=stage_endpoint):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def reset():
+    """Обнуляет все метрики процесса (между сценариями бенчмарка)"""
+    global _started
+    _stages.clear()
+    _started = time.monotonic()
+
+
+def stages() -> list:
+    return sorted(list(_stages.values()), key=lambda stage: (stage.name, stage.chain, stage.endpoint))
+
+
+def format_seconds(seconds) -> str:
+    return f"{seconds * 1000:.0f}мс" if seconds < 1 else f"{seconds:.2f}с"
+
+
+def table(title="Метрики этапов"):
+    # rich нужен только для отчёта - не тянем его при импорте
+    from rich.table import Table
+
+    result = Table(title=title)
+    for column in ("Этап", "Сеть", "Эндпоинт", "Всего", "Ошибок", "Сейчас", "p50", "p90", "p99", "max", "в сек"):
+        result.add_column(column, justify="left" if column in ("Этап", "Сеть", "Эндпоинт") else "right")
+
+    elapsed = time.monotonic() - _started
+    for stage in stages():
+        histogram = stage.histogram
+        rate = histogram.count / elapsed if elapsed else 0
+        result.add_row(
+            stage.name, stage.chain, stage.endpoint, str(histogram.count), str(stage.failed), str(stage.in_flight),
+            *(format_seconds(value) for value in histogram.quantiles()), format_seconds(histogram.max),
+            f"{rate:.1f}")
+    return result
+
+
+def print_table(title="Метрики этапов"):
+    global _console
+    if _console is None:
+        from rich.console import Console
+        _console = Console()
+    if _stages:
+        _console.print(table(title))
+
+
+def label_string(stage, **extra) -> str:
+    labels = {"stage": stage.name, "chain": stage.chain, "endpoint": stage.endpoint, **extra}
+    return ",".join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def prometheus_text() -> str:
+    """Все метрики процесса в текстовом формате Prometheus (задержки - summary с квантилями)"""
+    current = stages()
+    lines = [f"# TYPE {PREFIX}_stage_seconds summary"]
+    for stage in current:
+        histogram = stage.histogram
+        for q, value in zip(QUANTILES, histogram.quantiles()):
+            lines.append(f"{PREFIX}_stage_seconds{{{label_string(stage, quantile=q)}}} {value}")
+        lines.append(f"{PREFIX}_stage_seconds_sum{{{label_string(stage)}}} {histogram.sum}")
+        lines.append(f"{PREFIX}_stage_seconds_count{{{label_string(stage)}}} {histogram.count}")
+
+    lines.append(f"# TYPE {PREFIX}_stage_total counter")
+    for stage in current:
+        lines.append(f"{PREFIX}_stage_total{{{label_string(stage, result='ok')}}} {stage.ok}")
+        lines.append(f"{PREFIX}_stage_total{{{label_string(stage, result='error')}}} {stage.failed}")
+
+    lines.append(f"# TYPE {PREFIX}_stage_in_flight gauge")
+    for stage in current:
+        lines.append(f"{PREFIX}_stage_in_flight{{{label_string(stage)}}} {stage.in_flight}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_path() -> str:
+    # У процессов-шардов свой файл: метрики каждого процесса свои
+    name = multiprocessing.current_process().name
+    suffix = "" if name == "MainProcess" else f"-{name}"
+    return os.path.join(METRICS_DIR, f"metrics{suffix}.prom")
+
+
+def write_prometheus(path=None):
+    """Пишет метрики в файл атомарно (для textfile-коллектора node_exporter)"""
+    path = path or metrics_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+
+
+def serve(port, host="127.0.0.1") -> ThreadingHTTPServer:
+    """Отдаёт /metrics на host:port из фонового потока; повторный вызов (следующая сеть прогона) - тот же сервер"""
+    global _server
+    if _server is not None:
+        return _server
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    _server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    logger.info(f"Метрики Prometheus: http://{host}:{port}/metrics")
+    return _server
+
+
+async def report_periodically(interval=None):
+    """Раз в interval секунд печатает таблицу этапов и обновляет файл метрик"""
+    interval = config.METRICS_INTERVAL if interval is None else interval
+    while True:
+        await asyncio.sleep(interval)
+        print_table()
+        write_prometheus()
+
+
+def start_reporting():
+    """Запускает периодический отчёт (и /metrics, если задан порт) по настройкам config; None - выключено"""
+    if config.METRICS_PORT and multiprocessing.current_process().name == "MainProcess":
+        try:
+            serve(config.METRICS_PORT)
+        except OSError as err:
+            logger.warning(f"Не удалось открыть порт метрик {config.METRICS_PORT}: {err}")
+    if config.METRICS_INTERVAL:
+        return asyncio.create_task(report_periodically())
+    return None
+
+
+def finish_reporting(reporter):
+    if reporter is not None:
+        reporter.cancel()
+    print_table("Метрики этапов за прогон")
+    write_prometheus()
@@ -0,0 +1,55 @@
+import asyncio
+
+# Ошибки ноды, после которых локальный nonce нужно перечитать из сети
+NONCE_ERRORS = (
+    "nonce too low",
+    "nonce too high",
+    "invalid nonce",
+    "replacement transaction underpriced",
+)
+# Нода уже держит ровно эту подписанную транзакцию (например, приняла её перед таймаутом и переключением
+# на другую ноду): это не расхождение nonce, а успешная отправка
+ALREADY_KNOWN = "already known"
+
+
+def is_nonce_error(err) -> bool:
+    return any(marker in str(err).lower() for marker in NONCE_ERRORS)
+
+
+def is_already_known(err) -> bool:
+    return ALREADY_KNOWN in str(err).lower()
+
+
+class NonceManager:
+    """
+    Локальный счётчик nonce по адресам одной сети.
+    Pending nonce читается из сети один раз, дальше номера выдаются по порядку без RPC.
+    """
+    def __init__(self, w3):
+        self.w3 = w3
+        self.nonces = {}
+        self.locks = {}
+
+    def lock(self, address):
+        lock = self.locks.get(address)
+        if lock is None:
+            lock = self.locks[address] = asyncio.Lock()
+        return lock
+
+    async def next(self, address) -> int:
+        async with self.lock(address):
+            nonce = self.nonces.get(address)
+            if nonce is None:
+                nonce = await self.w3.eth.get_transaction_count(address, "pending")
+            self.nonces[address] = nonce + 1
+            return nonce
+
+    async def reset(self, address):
+        """Забывает локальный nonce, следующий next() перечитает его из сети"""
+        async with self.lock(address):
+            self.nonces.pop(address, None)
+
+    def forget(self, address):
+        """Вызывается, когда работа с адресом закончена, чтобы не копить состояние по всем ключам"""
+        self.nonces.pop(address, None)
+        self.locks.pop(address, None)
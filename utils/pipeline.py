@@ -0,0 +1,243 @@
+import asyncio
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from eth_account import Account
+from eth_utils import to_hex
+from web3.exceptions import TimeExhausted
+
+import config
+from constants.constants import explorers
+from utils.address_book import derive_address, get_address_book
+from utils.balance_scan import required_balance
+from utils.chain_context import get_chain_context
+from utils.http_transport import AccountSession, get_transport
+from utils.key_loader import batched
+from utils.logger import logger
+from utils.nonce_manager import is_already_known, is_nonce_error
+from utils.retry import FATAL, TX_POLICY, call_with_retry, classify_tx_error
+from utils.schema_encoder import schema_shape
+from utils.schema_sync import sync_address_schemas
+from utils.sign import attest_calldata_many, register_calldata, shared_faker
+
+PRESIGN_BATCH = 200  # сколько ключей подписывать за один заход
+
+
+def sign_job(job):
+    """Выполняется в пуле процессов: (ключ, транзакция) -> (raw, хэш)"""
+    key, transaction = job
+    signed = Account.sign_transaction(transaction, key)
+    return bytes(signed.rawTransaction), to_hex(signed.hash)
+
+
+def create_pool():
+    # spawn: форк процесса с работающим event loop и потоком aiosqlite небезопасен
+    return ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+
+
+async def pool_map(pool, func, items):
+    loop = asyncio.get_running_loop()
+    chunksize = max(1, len(items) // (pool._max_workers * 4))
+    return await loop.run_in_executor(None, lambda: list(pool.map(func, items, chunksize=chunksize)))
+
+
+async def presign(db, keys, mode, chain, pool):
+    """
+    Этап 1: строит и подписывает транзакции register/attest пачками ключей и складывает их в очередь в базе.
+    Nonce пачки берутся одним batch-запросом, адреса и подписи считаются в пуле процессов.
+    calldata собирается здесь же: лимит газа зависит от её длины и должен быть известен до подписи.
+    Адреса, у которых в очереди ещё есть неразосланные транзакции (повторный запуск после падения), пропускаются:
+    nonce из сети у них те же, и вторая подпись дала бы конкурирующие транзакции.
+    """
+    ctx = get_chain_context(chain)
+    fake = shared_faker()
+    book = get_address_book() if mode == "attestations" else None
+    counts = config.SCHEMAS_TO_CREATE if mode == "schemas" else config.ATTESTATIONS_TO_CREATE
+    signed_total = 0
+
+    for batch in batched(keys, PRESIGN_BATCH):
+        addresses = await pool_map(pool, derive_address, batch)
+        queued = await db.get_queued_addresses(chain, addresses)
+        if queued:
+            logger.info(f"Уже в очереди, пропускаю ключей: {len(queued)}")
+            batch = [key for key, address in zip(batch, addresses) if address not in queued]
+            addresses = [address for address in addresses if address not in queued]
+            if not batch:
+                continue
+        # nonce и баланс каждого адреса - в одном batch-запросе
+        results = await ctx.batch.call([
+            call for address in addresses
+            for call in (("eth_getTransactionCount", [address, "pending"]), ("eth_getBalance", [address, "latest"]))
+        ])
+        nonces, balances = results[::2], results[1::2]
+        fees = await ctx.gas.fees()
+        need = await required_balance(ctx, mode)
+
+        # План пачки: какие транзакции с какими nonce отправит каждый ключ
+        plan = []
+        for key, address, nonce, balance in zip(batch, addresses, nonces, balances):
+            if isinstance(nonce, Exception):
+                logger.error(f"{address} | Не получил nonce, пропускаю: {nonce}")
+                continue
+            if not isinstance(balance, Exception) and int(balance, 16) < need:
+                logger.warning(f"{address} | Баланс {int(balance, 16) / 1e18:.6f} меньше нужного на газ, пропускаю")
+                continue
+            nonce = int(nonce, 16)
+            plan.extend((key, address, nonce + offset) for offset in range(random.randint(counts[0], counts[1])))
+
+        if mode == "schemas":
+            calldata = [register_calldata(ctx, fake, address) for _, address, _ in plan]
+            calls = [("register", None)] * len(plan)
+        else:
+            schemas = [await db.get_random_schema(chain=chain) for _ in plan]
+            if plan and schemas[0] is None:
+                logger.warning(f"В базе нет схем для сети {chain}, сначала создайте схемы")
+                return signed_total
+            # data аттестаций кодируются пачками по схемам
+            calldata = attest_calldata_many(ctx, fake, [
+                (address, schema_id, fields, book.random())
+                for (_, address, _), (schema_id, fields) in zip(plan, schemas)
+            ])
+            calls = [("attest", schema_shape(fields)) for _, fields in schemas]
+
+        jobs = []
+        meta = []
+        skipped = set()
+        for (key, address, nonce), data, (function, shape) in zip(plan, calldata, calls):
+            if address in skipped:
+                continue
+            transaction = {
+                'from': address,
+                'to': ctx.contract_address,
+                'value': 0,
+                'data': data,
+                'nonce': nonce,
+                'chainId': ctx.chain_id,
+                **fees
+            }
+            try:
+                transaction['gas'], _, _ = await ctx.estimates.estimate(transaction, function, shape)
+            except Exception as err:
+                logger.warning(f"{address} | Не удалось оценить газ, пропускаю ключ: {err}")
+                skipped.add(address)
+                continue
+
+            jobs.append((key, transaction))
+            meta.append((chain, mode, address, nonce))
+
+        signed = await pool_map(pool, sign_job, jobs)
+        await db.enqueue_signed([(*row, raw, tx_hash) for row, (raw, tx_hash) in zip(meta, signed)])
+        signed_total += len(signed)
+        logger.info(f"Подписано и поставлено в очередь: {signed_total}")
+
+    return signed_total
+
+
+def classify_broadcast_error(err) -> str:
+    # Подписанную транзакцию с другим nonce не переподписать - разбор ошибки nonce на вызывающем
+    if is_nonce_error(err) or is_already_known(err):
+        return FATAL
+    return classify_tx_error(err)
+
+
+async def broadcast(db, chain, rate=None):
+    """
+    Этап 2: рассылает подписанные транзакции из очереди не быстрее rate в секунду и ждёт квитанции.
+    Можно запускать повторно: отправленные, но не подтверждённые транзакции проверяются заново.
+    Транзакция, которую вытеснила другая с тем же nonce или которая не попала в блок за время ожидания
+    квитанции, помечается dropped и больше не ждётся.
+    """
+    ctx = get_chain_context(chain)
+    rate = config.BROADCAST_RATE if rate is None else rate
+    interval = 1 / rate if rate else 0
+    explorer_url = explorers.get(chain)
+
+    async def confirm(tx_hash, address, mode):
+        with logger.contextualize(address=address, chain=chain, tx_hash=tx_hash):
+            return await wait_receipt(tx_hash, address, mode)
+
+    async def wait_receipt(tx_hash, address, mode):
+        try:
+            receipt = await ctx.receipts.track(tx_hash)
+        except TimeExhausted as err:
+            # За время ожидания в блок не попала - потеряна или вытеснена, больше её не ждём
+            await db.set_signed_status(tx_hash, "dropped")
+            logger.error(f"{address} | Не дождался квитанции {explorer_url}{tx_hash}: {err}")
+            return None
+        except Exception as err:
+            # Статус остаётся 'sent' - при следующей рассылке квитанция будет запрошена снова
+            logger.error(f"{address} | Не дождался квитанции {explorer_url}{tx_hash}: {err}")
+            return None
+
+        if receipt.status == 1:
+            await db.set_signed_status(tx_hash, "confirmed")
+            logger.success(f"{address} | {mode}: {explorer_url}{tx_hash}")
+            return address
+        await db.set_signed_status(tx_hash, "failed")
+        logger.error(f"{address} | Transaction failed with hash {tx_hash}")
+        return None
+
+    rows = await db.get_signed(chain)
+    logger.info(f"В очереди на отправку/проверку: {len(rows)}")
+
+    confirmations = []
+    broken = set()  # адреса, у которых транзакция не ушла: следующие nonce всё равно застрянут
+    for _, mode, address, nonce, raw, tx_hash, status in rows:
+        if status == "signed":
+            if address in broken:
+                await db.set_signed_status(tx_hash, "failed")
+                continue
+            try:
+                await call_with_retry(
+                    ctx.w3.eth.send_raw_transaction, raw, endpoint=f"rpc:{chain}", policy=TX_POLICY,
+                    classify=classify_broadcast_error, label=address)
+            except Exception as err:
+                if not (is_nonce_error(err) or is_already_known(err)):
+                    logger.error(f"{address} | Транзакция с nonce {nonce} не отправлена: {err}")
+                    broken.add(address)
+                    await db.set_signed_status(tx_hash, "failed")
+                    continue
+                # already known / nonce too low: либо это наша транзакция уже в сети, либо nonce занят другой
+                try:
+                    known, = await ctx.batch.call([("eth_getTransactionByHash", [tx_hash])])
+                except Exception as lookup_error:
+                    known = lookup_error  # не узнали - решит квитанция
+                if known is None:
+                    logger.warning(f"{address} | Nonce {nonce} не подходит ({err}), транзакцию отбрасываю")
+                    await db.set_signed_status(tx_hash, "dropped")
+                    continue
+            await db.set_signed_status(tx_hash, "sent")
+            if interval:
+                await asyncio.sleep(interval)
+        confirmations.append(asyncio.ensure_future(confirm(tx_hash, address, mode)))
+
+    confirmed = [address for address in await asyncio.gather(*confirmations) if address]
+    logger.info(f"Подтверждено транзакций: {len(confirmed)} из {len(rows)}")
+    return confirmed, len(rows) - len(confirmed)
+
+
+async def sync_registrants(db, chain, addresses):
+    """После рассылки register записывает новые схемы адресов в базу"""
+    session = AccountSession(get_transport())
+    inserted = 0
+    for address in set(addresses):
+        try:
+            inserted += await sync_address_schemas(session, db, address, chain)
+        except Exception as err:
+            logger.error(f"{address} | Не удалось записать схемы: {err}")
+    logger.success(f"Записал схемы в базу, новых: {inserted}")
+
+
+async def run_pipeline(db, keys, mode, chain, stages=("sign", "broadcast")) -> int:
+    """Возвращает число транзакций из очереди, которые рассылка не подтвердила (0, если рассылки не было)"""
+    if "sign" in stages:
+        with create_pool() as pool:
+            await presign(db, keys, mode, chain, pool)
+
+    unconfirmed = 0
+    if "broadcast" in stages:
+        confirmed, unconfirmed = await broadcast(db, chain)
+        if mode == "schemas" and confirmed:
+            await sync_registrants(db, chain, confirmed)
+    return unconfirmed
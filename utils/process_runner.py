@@ -0,0 +1,96 @@
+import math
+import multiprocessing
+import queue as queue_module
+import time
+
+from utils.event_loop import run_async
+from utils.key_loader import KEYS_PATH, KeyLoader
+from utils.logger import logger
+
+REPORT_INTERVAL = 10  # как часто координатор печатает общий прогресс, секунд
+
+
+def shard_ranges(keys_range, processes, path=KEYS_PATH):
+    """Делит диапазон строк файла ключей на processes кусков примерно поровну"""
+    start = keys_range[0] or 0
+    total = KeyLoader(path, *keys_range).count()
+    size = max(1, math.ceil(total / processes))
+    return [(start + i, start + min(i + size, total)) for i in range(0, total, size)]
+
+
+def shard_main(shard, mode, network, keys_range, threads, reports, resume=False, path=KEYS_PATH):
+    """Точка входа дочернего процесса: свой event loop, свои потоки, свой кусок ключей"""
+    # Модуль main импортируется заново в дочернем процессе (spawn), поэтому импорт здесь, а не наверху
+    from main import run_keys
+
+    run_async(run_keys(mode, network, keys_range, threads, resume=resume, path=path,
+                       on_progress=lambda snapshot: reports.put((shard, snapshot))))
+
+
+def total_of(snapshots, field):
+    return sum(snapshot.get(field, 0) for snapshot in snapshots.values())
+
+
+def run_sharded(mode, network, keys_range, processes, threads, path=KEYS_PATH, resume=False):
+    """
+    Координатор: раздаёт куски файла ключей процессам, собирает их прогресс и печатает общий итог.
+    Схемы все процессы пишут в одну базу - WAL и busy_timeout в Database это выдерживают.
+    """
+    ranges = shard_ranges(keys_range, processes, path)
+    if not ranges:
+        logger.warning("В выбранном диапазоне нет ключей")
+        return
+
+    if mode == "attestations":
+        from utils.address_book import get_address_book
+
+        # Получатели аттестаций - из всего файла: адреса считаются здесь один раз, а не в каждом процессе
+        get_address_book(path)
+
+    context = multiprocessing.get_context("spawn")
+    reports = context.Queue()
+    workers = [
+        context.Process(target=shard_main, args=(shard, mode, network, shard_range, threads, reports, resume, path),
+                        name=f"shard-{shard}")
+        for shard, shard_range in enumerate(ranges, start=1)
+    ]
+    for worker in workers:
+        worker.start()
+    logger.info(f"Запущено процессов: {len(workers)}, по {threads} потоков, диапазоны строк: {ranges}")
+
+    snapshots = {}
+    last_report = time.monotonic()
+    while True:
+        try:
+            shard, snapshot = reports.get(timeout=1)
+            snapshots[shard] = snapshot
+        except queue_module.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                break
+        except KeyboardInterrupt:
+            # Ctrl+C получают и процессы: они дорабатывают текущие ключи, координатор ждёт их итогов
+            logger.warning("Жду, пока процессы доработают текущие ключи")
+            continue
+
+        if time.monotonic() - last_report > REPORT_INTERVAL:
+            last_report = time.monotonic()
+            logger.info(f"Прогресс: {total_of(snapshots, 'done') + total_of(snapshots, 'failed')} "
+                        f"из {total_of(snapshots, 'total')} ключей")
+
+    crashed = 0
+    for worker in workers:
+        worker.join()
+        if worker.exitcode:
+            crashed += 1
+            logger.error(f"Процесс {worker.name} завершился с кодом {worker.exitcode}")
+
+    logger.success(
+        f"Итого по {len(workers)} процессам: "
+        f"обработано {total_of(snapshots, 'done') + total_of(snapshots, 'failed')} из {total_of(snapshots, 'total')}, "
+        f"с ошибкой {total_of(snapshots, 'failed')}, "
+        f"отложено без денег на газ {total_of(snapshots, 'unfunded')}, "
+        f"пропущено битых {total_of(snapshots, 'invalid')}, дубликатов {total_of(snapshots, 'duplicates')}, "
+        f"упало процессов {crashed}")
+    totals = {field: total_of(snapshots, field) for field in ("total", "done", "failed", "unfunded")}
+    totals["crashed"] = crashed
+    return totals
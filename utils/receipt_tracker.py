@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+from web3.datastructures import AttributeDict
+from web3.exceptions import TimeExhausted
+
+from utils.logger import logger
+
+RECEIPT_POLL_INTERVAL = 2  # секунд между опросами
+RECEIPT_TIMEOUT = 240  # сколько ждём квитанцию, прежде чем считать транзакцию потерянной
+RECEIPT_BATCH_SIZE = 100  # хэшей в одном batch-запросе
+
+
+def format_receipt(raw) -> AttributeDict:
+    receipt = dict(raw)
+    for field in ("status", "blockNumber", "gasUsed", "cumulativeGasUsed", "effectiveGasPrice", "transactionIndex"):
+        if isinstance(receipt.get(field), str):
+            receipt[field] = int(receipt[field], 16)
+    return AttributeDict(receipt)
+
+
+class ReceiptTracker:
+    """
+    Один фоновый опросчик квитанций на сеть. Потоки отдают хэш и получают future,
+    а опросчик раз в RECEIPT_POLL_INTERVAL запрашивает все ожидающие хэши batch-запросами.
+    """
+    def __init__(self, batch, poll_interval=RECEIPT_POLL_INTERVAL, timeout=RECEIPT_TIMEOUT,
+                 batch_size=RECEIPT_BATCH_SIZE):
+        self.batch = batch
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.pending = {}  # tx_hash -> (future, deadline)
+        self.task = None
+
+    def track(self, tx_hash) -> asyncio.Future:
+        tx_hash = tx_hash.hex() if isinstance(tx_hash, bytes) else tx_hash
+        if not tx_hash.startswith("0x"):
+            tx_hash = "0x" + tx_hash
+
+        entry = self.pending.get(tx_hash)
+        if entry is not None:
+            return entry[0]
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[tx_hash] = (future, time.monotonic() + self.timeout)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        return future
+
+    async def run(self):
+        while self.pending:
+            await asyncio.sleep(self.poll_interval)
+            hashes = list(self.pending)
+            for i in range(0, len(hashes), self.batch_size):
+                await self.poll(hashes[i:i + self.batch_size])
+
+    async def poll(self, hashes):
+        try:
+            results = await self.batch.call([("eth_getTransactionReceipt", [tx_hash]) for tx_hash in hashes])
+        except Exception as err:
+            logger.warning(f"Не удалось опросить квитанции ({len(hashes)} шт.): {err}")
+            results = [err] * len(hashes)
+
+        now = time.monotonic()
+        for tx_hash, result in zip(hashes, results):
+            future, deadline = self.pending[tx_hash]
+            if future.done():
+                # Ожидающий отменил future, отслеживать дальше незачем
+                del self.pending[tx_hash]
+            elif result is not None and not isinstance(result, Exception):
+                del self.pending[tx_hash]
+                future.set_result(format_receipt(result))
+            elif now > deadline:
+                del self.pending[tx_hash]
+                future.set_exception(TimeExhausted(
+                    f"Transaction {tx_hash} is not in the chain after {self.timeout} seconds"))
@@ -0,0 +1,161 @@
+import asyncio
+import contextlib
+import random
+import time
+from collections import namedtuple
+
+from utils.logger import logger
+from utils.nonce_manager import is_nonce_error
+
+# Что делать с ошибкой: повторить с паузой, повторить сразу, не повторять
+RETRY, RETRY_NOW, FATAL = "retry", "retry_now", "fatal"
+
+# attempts - всего попыток; задержка base * 2^n со случайным разбросом, но не больше cap секунд
+RetryPolicy = namedtuple("RetryPolicy", ["attempts", "base", "cap"])
+
+DEFAULT_POLICY = RetryPolicy(attempts=7, base=2, cap=60)
+TX_POLICY = RetryPolicy(attempts=5, base=2, cap=30)
+
+BREAKER_THRESHOLD = 5  # сколько ошибок подряд открывают предохранитель эндпоинта
+BREAKER_COOLDOWN = 30  # сколько секунд эндпоинт отдыхает, прежде чем пустить пробный запрос
+BUDGET_RATIO = 0.2  # повторов может быть не больше 20% от успешных запросов к эндпоинту...
+BUDGET_MIN = 10  # ...плюс небольшой запас, чтобы было чем повторять на старте
+
+NO_GAS_MESSAGES = ("insufficient funds", "gas required exceeds")
+
+_breakers = {}
+
+
+def is_no_gas(err) -> bool:
+    if err.args == ('execution reverted', 'no data'):
+        return True
+    return any(message in str(err).lower() for message in NO_GAS_MESSAGES)
+
+
+def classify_error(err) -> str:
+    """Общая классификация: сетевые и прочие непредвиденные ошибки повторяем, нехватку газа - нет"""
+    if is_no_gas(err):
+        return FATAL
+    return RETRY
+
+
+def classify_tx_error(err) -> str:
+    """
+    Ошибки отправки транзакции: разошедшийся nonce повторяем сразу (счётчик уже сброшен),
+    остальные ответы ноды (ValueError) и revert - это проблема самой транзакции, повторять бессмысленно.
+    """
+    if isinstance(err, ValueError) and is_nonce_error(err):
+        return RETRY_NOW
+    if isinstance(err, ValueError) or is_no_gas(err):
+        return FATAL
+    return RETRY
+
+
+class CircuitBreaker:
+    """
+    Предохранитель одного эндпоинта (API логина, scan API, RPC сети). После BREAKER_THRESHOLD ошибок подряд
+    запросы к нему не идут BREAKER_COOLDOWN секунд, потом пропускается один пробный.
+    Ошибки одного эндпоинта не тормозят работу с остальными.
+    """
+    def __init__(self, name, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.budget = BUDGET_MIN
+
+    def retry_after(self) -> float:
+        """0 - можно слать запрос; иначе сколько секунд ждать до пробного запроса"""
+        if self.opened_at is None:
+            return 0
+        left = self.opened_at + self.cooldown - time.monotonic()
+        if left > 0:
+            return left
+        if self.probing:
+            # Пробный запрос уже в пути, остальные ждут его результата
+            return 1
+        self.probing = True
+        return 0
+
+    def success(self):
+        if self.opened_at is not None:
+            logger.info(f"Эндпоинт {self.name} снова отвечает")
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.budget = min(self.budget + BUDGET_RATIO, BUDGET_MIN * 10)
+
+    def failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning(f"Эндпоинт {self.name}: {self.failures} ошибок подряд, пауза {self.cooldown} с")
+            self.opened_at = time.monotonic()
+
+    def take_retry(self) -> bool:
+        """Списывает один повтор из бюджета эндпоинта; False - бюджет исчерпан, повторять нельзя"""
+        if self.budget < 1:
+            return False
+        self.budget -= 1
+        return True
+
+
+def get_breaker(endpoint) -> CircuitBreaker:
+    breaker = _breakers.get(endpoint)
+    if breaker is None:
+        breaker = _breakers[endpoint] = CircuitBreaker(endpoint)
+    return breaker
+
+
+def backoff(policy, attempt) -> float:
+    """Экспоненциальная пауза с полным разбросом: потоки не повторяют запросы одновременно"""
+    return random.uniform(0, min(policy.cap, policy.base * 2 ** attempt))
+
+
+async def call_with_retry(func, *args, endpoint, policy=DEFAULT_POLICY, classify=classify_error, label="",
+                          gate=None, **kwargs):
+    """
+    Вызывает func(*args, **kwargs) через предохранитель endpoint с повторами по policy.
+    gate - фабрика async-контекста (например, семафор этапа), который держится только на время попытки,
+    но не на время пауз. Фатальная ошибка или исчерпанные попытки/бюджет - исключение наружу.
+    """
+    breaker = get_breaker(endpoint)
+    prefix = f"{label} | " if label else ""
+
+    for attempt in range(policy.attempts):
+        wait = breaker.retry_after()
+        while wait:
+            await asyncio.sleep(wait)
+            wait = breaker.retry_after()
+
+        try:
+            async with gate() if gate else contextlib.nullcontext():
+                result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as err:
+            kind = classify(err)
+            if kind == RETRY:
+                breaker.failure()
+            else:
+                # Эндпоинт ответил, просто ответ нас не устроил - предохранителю это не ошибка
+                breaker.success()
+            if kind == FATAL:
+                raise
+
+            if attempt + 1 >= policy.attempts:
+                raise
+            if not breaker.take_retry():
+                logger.warning(f"{prefix}Бюджет повторов эндпоинта {endpoint} исчерпан, не повторяю")
+                raise
+
+            delay = 0 if kind == RETRY_NOW else backoff(policy, attempt)
+            logger.warning(f"{prefix}Ошибка {getattr(func, '__name__', 'вызова')} ({endpoint}), "
+                           f"повтор {attempt + 2}/{policy.attempts} через {delay:.1f} с: {err}")
+            await asyncio.sleep(delay)
+        else:
+            breaker.success()
+            return result
@@ -0,0 +1,43 @@
+import itertools
+import json
+
+
+class BatchRpc:
+    """
+    Отправка нескольких JSON-RPC вызовов одним HTTP-запросом (batch).
+    web3 6.x не умеет батчи в асинхронном режиме, поэтому запрос собирается здесь и уходит через пул нод.
+    """
+    def __init__(self, pool):
+        self.pool = pool
+        self.ids = itertools.count(1)
+
+    async def call(self, calls, hedge=True):
+        """
+        calls: [(method, params)]. Возвращает список результатов в том же порядке;
+        на месте вызова, который нода вернула с ошибкой, лежит исключение ValueError.
+        hedge=False для пишущих вызовов: их нельзя дублировать на вторую ноду по таймауту.
+        """
+        if not calls:
+            return []
+
+        payload = [
+            {"jsonrpc": "2.0", "id": next(self.ids), "method": method, "params": params}
+            for method, params in calls
+        ]
+        data = await self.pool.post(json.dumps(payload).encode(), hedge=hedge)
+
+        # Некоторые ноды отвечают на весь батч одной ошибкой
+        if isinstance(data, dict):
+            raise ValueError(data.get("error", data))
+
+        by_id = {item.get("id"): item for item in data}
+        results = []
+        for request in payload:
+            item = by_id.get(request["id"])
+            if item is None:
+                results.append(ValueError(f"Нет ответа на {request['method']}"))
+            elif item.get("error") is not None:
+                results.append(ValueError(item["error"]))
+            else:
+                results.append(item.get("result"))
+        return results
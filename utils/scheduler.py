@@ -0,0 +1,135 @@
+import asyncio
+import contextlib
+import signal
+from collections import namedtuple
+
+from utils.logger import logger
+from utils.metrics import timer
+
+# Единица работы: один ключ в одном режиме в одной сети
+WorkItem = namedtuple("WorkItem", ["key", "mode", "chain"])
+
+
+class Progress:
+    def __init__(self, total):
+        self.total = total
+        self.started = 0
+        self.done = 0
+        self.failed = 0
+
+    def start(self) -> int:
+        self.started += 1
+        return self.started
+
+    def snapshot(self) -> dict:
+        return {"total": self.total, "started": self.started, "done": self.done, "failed": self.failed}
+
+    def summary(self) -> str:
+        return f"обработано {self.done + self.failed} из {self.total}, с ошибкой {self.failed}"
+
+
+class Scheduler:
+    """
+    Очередь задач и пул потоков-воркеров. Ключи подаются в очередь по мере того, как воркеры их разбирают,
+    этапы (логин, RPC, база) ограничены своими семафорами.
+
+    Ctrl+C: первый - новые ключи не берутся, текущие дорабатываются; второй - текущие прерываются.
+    """
+    def __init__(self, workers, total, limits=None, queue_size=None):
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size or workers * 2)
+        self.limits = {stage: asyncio.Semaphore(n) for stage, n in (limits or {}).items() if n}
+        self.progress = Progress(total)
+        self.stopping = False
+        self.tasks = []
+
+    def limit(self, stage):
+        """async with scheduler.limit("rpc"): ... - не больше N потоков на этапе одновременно"""
+        return self.limits.get(stage) or contextlib.nullcontext()
+
+    def request_stop(self):
+        if not self.stopping:
+            self.stopping = True
+            logger.warning("Останавливаюсь: новые ключи не беру, дорабатываю текущие. Повторный Ctrl+C прервёт их")
+        else:
+            logger.warning("Прерываю текущие ключи")
+            for task in self.tasks:
+                task.cancel()
+
+    @contextlib.contextmanager
+    def signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        installed = []
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.request_stop)
+                installed.append(sig)
+            except (NotImplementedError, RuntimeError, ValueError):
+                # На Windows обработчиков сигналов в event loop нет, там Ctrl+C просто отменяет прогон
+                pass
+        try:
+            yield
+        finally:
+            for sig in installed:
+                loop.remove_signal_handler(sig)
+
+    async def produce(self, items):
+        # items - обычный или асинхронный итератор (например, ключи после проверки баланса)
+        try:
+            if hasattr(items, "__aiter__"):
+                async for item in items:
+                    if self.stopping:
+                        break
+                    await self.queue.put(item)
+            else:
+                for item in items:
+                    if self.stopping:
+                        break
+                    await self.queue.put(item)
+        finally:
+            # Конец очереди ставится и когда источник ключей упал - иначе воркеры вечно ждут queue.get()
+            for _ in range(self.workers):
+                if self.stopping:
+                    # При остановке воркеры выходят по флагу, сигнал нужен только ждущим пустую очередь
+                    with contextlib.suppress(asyncio.QueueFull):
+                        self.queue.put_nowait(None)
+                else:
+                    await self.queue.put(None)
+
+    async def worker(self, thread, handler):
+        logger.info(f"Поток {thread} | Начал работу")
+        while not self.stopping:
+            item = await self.queue.get()
+            if item is None:
+                break
+
+            index = self.progress.start()
+            try:
+                with timer("key", item.chain):
+                    await handler(thread, item, index)
+                self.progress.done += 1
+            except asyncio.CancelledError:
+                self.progress.failed += 1
+                raise
+            except Exception as err:
+                self.progress.failed += 1
+                logger.error(f"Поток {thread} | Ключ ...{item.key[29:]} не обработан: {err}")
+        logger.info(f"Поток {thread} | Закончил работу")
+
+    async def run(self, items, handler):
+        """handler(thread, item, index) вызывается для каждого WorkItem"""
+        with self.signal_handlers():
+            producer = asyncio.create_task(self.produce(items))
+            self.tasks = [asyncio.create_task(self.worker(thread, handler)) for thread in range(1, self.workers + 1)]
+            try:
+                await asyncio.gather(*self.tasks, return_exceptions=True)
+            finally:
+                producer.cancel()
+                for task in self.tasks:
+                    task.cancel()
+
+        # Ошибка источника ключей - наружу, после того как воркеры доработали уже выданные ключи
+        error, = await asyncio.gather(producer, return_exceptions=True)
+        if isinstance(error, Exception):
+            logger.error(f"Подача ключей прервана: {error}")
+            raise error
@@ -0,0 +1,64 @@
+import random
+
+from eth_abi.abi import default_codec
+from eth_abi.encoding import TupleEncoder
+
+# Чем заполнять поле аттестации каждого типа
+VALUE_FACTORIES = {
+    "string": lambda fake: fake.word(),
+    "bool": lambda fake: random.choice((True, False)),
+    "bytes": lambda fake: b"",
+    "uint256": lambda fake: 0,
+}
+
+# Кэш на процесс: у многих схем одинаковый набор типов, энкодер собирается один раз на набор
+_compiled = {}
+
+
+def tuple_encoder(types) -> TupleEncoder:
+    return TupleEncoder(encoders=[default_codec._registry.get_encoder(t) for t in types])
+
+
+_recipient_encoder = tuple_encoder(["string"])
+
+
+def encode_recipient(recipient: str) -> bytes:
+    """Получатель аттестации - ABI-кодированная строка, как encode(["string"], [recipient])"""
+    return _recipient_encoder.encode((recipient,))
+
+
+def schema_shape(fields) -> tuple:
+    return tuple(field["type"].lower() for field in fields)
+
+
+class SchemaEncoder:
+    """
+    Скомпилированная схема: фиксированный список типов полей, генераторы значений и готовый энкодер eth_abi.
+    Кодирует сразу в bytes, без определения типов по значениям и без перевода в hex и обратно.
+    """
+    def __init__(self, types):
+        unknown = [t for t in types if t not in VALUE_FACTORIES]
+        if unknown:
+            raise ValueError(f"Неизвестный тип данных: {', '.join(unknown)}")
+        self.types = types
+        self.factories = [VALUE_FACTORIES[t] for t in types]
+        self.encoder = tuple_encoder(types)
+
+    def values(self, fake) -> tuple:
+        return tuple(factory(fake) for factory in self.factories)
+
+    def encode(self, values) -> bytes:
+        return self.encoder.encode(values)
+
+    def encode_many(self, rows) -> list:
+        """Пачка значений одной схемы -> список закодированных data (для предподписи)"""
+        encode = self.encoder.encode
+        return [encode(values) for values in rows]
+
+
+def compile_schema(fields) -> SchemaEncoder:
+    shape = schema_shape(fields)
+    encoder = _compiled.get(shape)
+    if encoder is None:
+        encoder = _compiled[shape] = SchemaEncoder(shape)
+    return encoder
@@ -0,0 +1,78 @@
+import asyncio
+
+from constants.constants import chain_ids, scan_api
+
+SCHEMAS_PAGE_SIZE = 100
+SCHEMAS_PREFETCH = 2  # сколько страниц схем можно скачать наперёд
+
+
+async def fetch_schemas_page(session, address, page, size=SCHEMAS_PAGE_SIZE):
+    url = f'{scan_api}/addresses/{address}/schemas?id={address}&page={page}&size={size}'
+
+    response = await session.get(url)
+
+    if response.status_code != 200:
+        raise Exception(f"Error fetching schemas page {page}: {response.status_code}")
+
+    data = response.json()
+    if not data.get("success"):
+        raise Exception(f"Error in response data, page {page}: {data}")
+
+    data = data.get("data") or {}
+    return data.get("rows") or [], data.get("total")
+
+
+async def iter_address_schemas(session, address, size=SCHEMAS_PAGE_SIZE, prefetch=SCHEMAS_PREFETCH):
+    """
+    Асинхронный генератор по всем страницам схем адреса.
+    Следующие страницы (не больше prefetch) качаются в фоне, пока текущая пишется в базу.
+    """
+    queue = asyncio.Queue(maxsize=prefetch)
+
+    async def producer():
+        page = 1
+        try:
+            while True:
+                rows, total = await fetch_schemas_page(session, address, page, size)
+                await queue.put(rows)
+                if len(rows) < size or (total is not None and page * size >= int(total)):
+                    break
+                page += 1
+            await queue.put(None)
+        except Exception as err:
+            await queue.put(err)
+
+    task = asyncio.create_task(producer())
+    try:
+        while True:
+            rows = await queue.get()
+            if rows is None:
+                return
+            if isinstance(rows, Exception):
+                raise rows
+            yield rows
+    finally:
+        task.cancel()
+
+
+async def sync_address_schemas(session, db, address, chain, resume=True) -> int:
+    """
+    Записывает в базу схемы адреса в сети chain. С resume останавливается на первой странице,
+    где все схемы этой сети уже есть в базе. Возвращает число новых схем.
+    """
+    chain_id = str(chain_ids[chain])
+
+    inserted = 0
+    schemas = iter_address_schemas(session, address)
+    try:
+        async for rows in schemas:
+            filtered_schemas = [schema for schema in rows if schema.get("chainId") == chain_id]
+            new_schemas = await db.upsert_schemas(filtered_schemas, chain=chain)
+            inserted += new_schemas
+
+            # Дошли до схем, которые уже лежат в базе - дальше только старые, прекращаем
+            if resume and filtered_schemas and new_schemas == 0:
+                break
+    finally:
+        await schemas.aclose()
+    return inserted
@@ -1,42 +1,57 @@
 import asyncio
 import datetime
 import json
-import os
 import random
 import string
-from eth_abi import encode
-from eth_account import Account
-from web3.middleware import geth_poa_middleware
-from constants.constants import rpc, contract_addresses, chain_ids, explorers
-import config
+from hexbytes import HexBytes
+from web3.exceptions import TimeExhausted
+from constants.constants import chain_ids, explorers, sign_api
 from utils.logger import logger
-from curl_cffi.requests import AsyncSession
+from utils.metrics import timer
+from utils.nonce_manager import is_already_known
 from faker import Faker
 from fake_useragent import UserAgent
+from utils.address_book import fingerprint, get_address_book
+from utils.chain_context import get_chain_context
+from utils.http_transport import AccountSession, get_transport
+from utils.retry import TX_POLICY, call_with_retry, classify_tx_error, is_no_gas
+from utils.schema_encoder import compile_schema, encode_recipient, schema_shape
+from utils.schema_sync import sync_address_schemas
 from utils.web3_utils import Web3Utils
 
+# Faker и база user-agent'ов тяжёлые в создании, держим по одному экземпляру на процесс
+_faker = None
+_user_agent = None
+
+
+def shared_faker():
+    global _faker
+    if _faker is None:
+        _faker = Faker()
+    return _faker
+
+
+def shared_user_agent():
+    global _user_agent
+    if _user_agent is None:
+        _user_agent = UserAgent(os="Windows")
+    return _user_agent
+
 
 class Sign:
     def __init__(self, key: str, thread: int, db, chain):
         self.chain = chain
-        self.w3 = Web3Utils(key=key, http_provider=rpc.get(chain))
+        self.ctx = get_chain_context(chain)
+        self.w3 = Web3Utils(key=key, w3=self.ctx.w3, gas=self.ctx.gas)
         self.key = key
-        if config.USE_PROXY:
-            proxy = {
-                'http': config.PROXY,
-                'https': config.PROXY,
-            }
-            self.proxy = proxy
+        self.fingerprint = fingerprint(key)
         self.db = db
         self.thread = thread
-        self.fake = Faker()
+        self.fake = shared_faker()
         self.acct = self.w3.acct
         self.address = self.acct.address
-        self.abi = self.read_abi(os.path.join(os.path.dirname(os.path.dirname(__file__)), "abis", "abi.json"))
-        self.contract = self.w3.w3.eth.contract(address=contract_addresses.get(self.chain), abi=self.abi)
-        self.w3.w3.middleware_onion.inject(geth_poa_middleware, layer=0)
-        user_agent = UserAgent(os="Windows")
-        ua_string = user_agent.chrome
+        self.contract = self.ctx.contract
+        ua_string = shared_user_agent().chrome
         headers = {
             "accept": "*/*",
             "accept-language": "en-US,en;q=0.9",
@@ -52,13 +67,8 @@ class Sign:
             "user-agent": ua_string
         }
 
-        self.session = AsyncSession(
-            headers=headers,
-            proxies=self.proxy if config.USE_PROXY else None,  # Если USE_PROXY=False, передаём None
-            impersonate="chrome110",
-            verify=False,
-            trust_env=True
-        )
+        # Соединения общие на процесс (прокси, keep-alive, TLS), cookies и заголовки - свои у аккаунта
+        self.session = AccountSession(get_transport(), headers)
 
     async def login(self):
         def generate_nonce(length=12):
@@ -82,11 +92,13 @@ class Sign:
             "client": "MetaMask",
             "key": f"{self.address}"
         }
-        response = await self.session.post(url='https://app.sign.global/api/signin', json=data)
+        with timer("login", endpoint="sign_api"):
+            response = await self.session.post(url=f'{sign_api}/signin', json=data)
         if response.status_code == 201:
             success = response.json().get("success")
             if success:
                 logger.info(f"Поток {self.thread} | Залогинился")
+                return True
             else:
                 logger.error(f"Поток {self.thread} | Проблема с логином: {response.json()}")
                 return False
@@ -94,255 +106,239 @@ class Sign:
             logger.error(f"Поток {self.thread} | Проблема с логином: {response.json()}")
             return False
 
-    async def fetch_user_schemas(self, chain_name):
+    async def fetch_user_schemas(self, chain_name, resume=True):
         chain_id = chain_ids.get(chain_name)
         if not chain_id:
             logger.error(f"Поток {self.thread} | Unknown chain name: {chain_name}")
             return
 
-        url = f'https://mainnet-rpc.sign.global/api/scan/addresses/{self.address}/schemas?id={self.address}&page=1&size=100'
-
-        response = await self.session.get(url)
+        with timer("schemas_sync", chain_name, "scan_api"):
+            inserted = await sync_address_schemas(self.session, self.db, self.address, chain_name, resume=resume)
+        logger.success(f"Поток {self.thread} | Записал схемы в базу, новых: {inserted}")
+        return inserted
 
-        if response.status_code != 200:
-            logger.error(f"Error fetching data: {response.status}")
-            return
+    async def build_transaction(self, data: bytes, nonce: int) -> dict:
+        """
+        Собирает транзакцию к контракту Sign из готовой calldata (без газа).
+        """
+        return {
+            'from': self.address,
+            'to': self.ctx.contract_address,
+            'value': 0,
+            'data': data,
+            'nonce': nonce,
+            'chainId': self.ctx.chain_id,
+            **await self.ctx.gas.fees()
+        }
 
-        data = response.json()
-        if not data.get("success"):
-            logger.error(f"Поток {self.thread} | Error in response data")
-            return
+    async def send_contract_transaction(self, data: bytes, function: str, shape=None):
+        """
+        Подбирает газ (из кэша оценок или estimate_gas), подписывает и отправляет транзакцию
+        с nonce из локального счётчика. Возвращает (хэш, ключ кэша оценки или None, если оценка свежая).
+        """
+        nonce = await self.ctx.nonces.next(self.address)
+        try:
+            transaction = await self.build_transaction(data, nonce)
+
+            # Газ из кэша по форме вызова, при промахе - оценка ноды
+            with timer("estimate_gas", self.chain):
+                transaction['gas'], estimate_key, cached = await self.ctx.estimates.estimate(transaction, function, shape)
+
+            signed_transaction = self.w3.sign_transaction(transaction)
+            with timer("send_raw_transaction", self.chain):
+                try:
+                    tx_hash = await self.w3.send_raw_transaction(signed_transaction.rawTransaction)
+                except ValueError as err:
+                    if not is_already_known(err):
+                        raise
+                    # Эта же транзакция уже в mempool: nonce занят ею, отслеживаем её хэш
+                    tx_hash = signed_transaction.hash
+            return tx_hash, estimate_key if cached else None
+        except Exception:
+            # Транзакция с этим nonce не ушла в сеть, следующий запрос перечитает nonce из pending
+            await self.ctx.nonces.reset(self.address)
+            raise
+
+    async def journal_sent(self, tx_hash, mode):
+        """Отмечает отправленную транзакцию в журнале, чтобы после падения её можно было перепроверить"""
+        await self.db.set_journal_transaction(tx_hash.hex(), self.fingerprint, mode, self.chain, "pending")
+
+    def track_transaction(self, tx_hash, success_message, details="", estimate_key=None, mode=None,
+                          recheck=False) -> asyncio.Future:
+        """
+        Отдаёт хэш фоновому опросчику квитанций. Возвращает future, который завершится True/False
+        после подтверждения; логирование результата и запись в журнал (если задан mode) висят на нём же.
+        """
+        tx_link = f"{explorers.get(self.chain)}{tx_hash.hex()}"
 
-        schemas = data.get("data", {}).get("rows", [])
-        filtered_schemas = [schema for schema in schemas if schema.get("chainId") == str(chain_id)]
-
-        for schema in filtered_schemas:
-            if not await self.db.schema_exists(schema["id"], chain=self.chain):
-                await self.db.insert_schema(schema, chain=self.chain)
-        logger.success(f"Поток {self.thread} | Записал схемы в базу")
-
-    def read_abi(self, path) -> dict:
-        with open(path, "r") as f:
-            return json.load(f)
-
-    async def create_schema(self):
-        def generate_data() -> str:
-            field_types = ["string", "bool", "bytes", "uint256"]
-
-            data = {
-                "name": self.fake.word(),
-                "description": self.fake.sentence(nb_words=random.randint(5, 15)),
-                "data": [
-                    {
-                        "name": self.fake.word(),
-                        "type": random.choice(field_types)
-                    }
-                    for _ in range(random.randint(1, 5))
-                ]
-            }
-            return json.dumps(data, ensure_ascii=False)
+        async def confirm():
+            with logger.contextualize(tx_hash=tx_hash.hex()):
+                return await wait_receipt()
 
-        for _ in range(5):
+        async def wait_receipt():
             try:
-                data = generate_data()
-                schema_data = json.dumps(data)
-
-                schema = (
-                    self.address,  # registrant
-                    True,  # revocable
-                    0,  # dataLocation (пример, зависит от контракта)
-                    0,  # maxValidFor (в секундах)
-                    "0x0000000000000000000000000000000000000000",  # hook (если нет хука)
-                    0,  # timestamp (текущее время)
-                    data  # data
-                )
-
-                delegate_signature = b''
-
-                # Строим необработанную транзакцию (без газа)
-
-                transaction = self.contract.functions.register(schema=schema, delegateSignature=delegate_signature).build_transaction({
-                    'from': self.address,
-                    'nonce': self.w3.w3.eth.get_transaction_count(self.address),
-                    'chainId': chain_ids.get(self.chain),
-                    'gasPrice': self.w3.w3.to_wei(1, 'gwei') if self.chain=="bsc" else self.w3.w3.eth.gas_price
-                })
-
-                # Оцениваем газ
-                estimated_gas = self.w3.w3.eth.estimate_gas(transaction)
-
-                # Строим окончательную транзакцию с рассчитанным газом
-                transaction['gas'] = int(estimated_gas * 1.05)
-                signed_transaction = self.w3.w3.eth.account.sign_transaction(transaction, private_key=self.key)
-                tx_hash = self.w3.w3.eth.send_raw_transaction(signed_transaction.rawTransaction)
-                receipt = self.w3.w3.eth.wait_for_transaction_receipt(tx_hash)
-
-                if receipt.status == 1:
-                    explorer_url = explorers.get(self.chain)
-                    tx_link = f"{explorer_url}{tx_hash.hex()}"
-
-                    logger.success(f"Поток {self.thread} | Schema created successfully: {tx_link}")
-                    return True
-                else:
-                    raise Exception(f"Поток {self.thread} | Transaction failed with hash {tx_hash.hex()}")
-
-            except ValueError as value_error:
-                logger.warning(f"Поток {self.thread} | Тут нет денег на газ")
-                return False
-
+                with timer("receipt", self.chain):
+                    receipt = await self.ctx.receipts.track(tx_hash)
             except Exception as err:
-                if err.args == ('execution reverted', 'no data'):
-                    logger.warning(f"Поток {self.thread} | Тут нет денег на газ")
-                    return False
-                else:
-                    logger.error(f"Поток {self.thread} | Failed schema creation: {err}")
-                    await asyncio.sleep(10)
+                if recheck and mode is not None and isinstance(err, TimeExhausted):
+                    # Квитанции нет и через прогон - транзакция потеряна, при --resume она будет создана заново
+                    await self.db.set_journal_transaction(tx_hash.hex(), self.fingerprint, mode, self.chain, "dropped")
+                # Иначе в журнале остаётся pending - при --resume квитанция будет запрошена снова
+                logger.error(f"Поток {self.thread} | Не дождался квитанции {tx_link}: {err}")
+                return False
 
-        return False
+            if mode is not None:
+                await self.db.set_journal_transaction(
+                    tx_hash.hex(), self.fingerprint, mode, self.chain, "confirmed" if receipt.status == 1 else "failed")
+
+            if receipt.status == 1:
+                logger.success(f"Поток {self.thread} | {success_message}: {tx_link}{details}")
+                return True
+            if estimate_key is not None:
+                # Возможно, не хватило газа из кэша - дальше для этой формы вызова спрашиваем ноду
+                self.ctx.estimates.invalidate(estimate_key)
+            logger.error(f"Поток {self.thread} | Transaction failed with hash {tx_hash.hex()}")
+            return False
 
-    def encode_string_to_bytes(self, string):
-        encoded_bytes = encode(["string"], [string])
+        return asyncio.ensure_future(confirm())
 
-        # Переводим в hex-формат
-        hex_result = "0x" + encoded_bytes.hex()
-        return hex_result
+    def recheck_transaction(self, tx_hash: str, mode) -> asyncio.Future:
+        """Ждёт квитанцию транзакции, отправленной в прошлом прогоне (из журнала)"""
+        return self.track_transaction(HexBytes(tx_hash), "Транзакция из прошлого прогона подтвердилась", mode=mode,
+                                      recheck=True)
 
-    def encode_tuple_to_bytes(self, data_tuple):
+    async def create_schema(self, gate=None):
         """
-        Кодирует кортеж (tuple) в байтовый формат (hex).
+        Отправляет транзакцию register. Возвращает future подтверждения или False, если отправить не удалось.
+        gate - ограничитель этапа, держится только на время попытки отправки.
         """
-        if not isinstance(data_tuple, tuple):
-            raise TypeError("Аргумент должен быть кортежем (tuple)")
-
-        # Определяем типы данных в кортеже
-        types = []
-        values = []
-
-        for item in data_tuple:
-            if isinstance(item, str):  # Строка → string
-                types.append("string")
-            elif isinstance(item, bool):  # Булево → bool
-                types.append("bool")
-            elif isinstance(item, int):  # Целые числа → uint256
-                types.append("uint256")
-            elif isinstance(item, bytes):  # Байтовые данные → bytes
-                types.append("bytes")
+        async def register():
+            return await self.send_contract_transaction(register_calldata(self.ctx, self.fake, self.address), "register")
+
+        try:
+            tx_hash, estimate_key = await call_with_retry(
+                register, endpoint=f"rpc:{self.chain}", policy=TX_POLICY, classify=classify_tx_error,
+                label=f"Поток {self.thread}", gate=gate)
+        except Exception as err:
+            if is_no_gas(err):
+                logger.warning(f"Поток {self.thread} | Тут нет денег на газ")
             else:
-                raise ValueError(f"Неизвестный тип данных: {type(item).__name__}")
-
-            values.append(item)
-
-        # Кодируем в байты
-        encoded_bytes = encode(types, values)
+                logger.error(f"Поток {self.thread} | Failed schema creation: {err}")
+            return False
 
-        # Переводим в hex-строку
-        return "0x" + encoded_bytes.hex()
+        # Вне повторов: ошибка записи в журнал не должна приводить к повторной отправке
+        await self.journal_sent(tx_hash, "schemas")
+        return self.track_transaction(tx_hash, "Schema created successfully", estimate_key=estimate_key, mode="schemas")
 
     async def get_random_address(self):
-        file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data/private_keys.txt")
-        # Читаем приватные ключи из файла
-        with open(file_path, "r") as f:
-            private_keys = [line.strip() for line in f if line.strip()]
-
-        if not private_keys:
-            raise ValueError("Файл пуст или содержит только пустые строки")
-
-        # Выбираем случайный приватный ключ
-        private_key = random.choice(private_keys)
-
-        # Создаём аккаунт из приватного ключа
-        account = Account.from_key(private_key)
-
-        # Возвращаем приватный ключ и его адрес
-        return account.address
-
-    async def create_attestation(self, schema_id):
-        def generate_data(fields_json):
-            fields = json.loads(fields_json)  # Преобразуем строку JSON в список Python
-            result = []
-
-            for field in fields:
-                field_type = field["type"].lower()
-                if field_type == "string":
-                    result.append(self.fake.word())
-                elif field_type == "bool":
-                    result.append(random.choice([True, False]))
-                elif field_type == "bytes":
-                    result.append("0x")
-                elif field_type == "uint256":
-                    result.append(0)
-                else:
-                    raise ValueError(f"Неизвестный тип данных: {field_type}")
-
-            return tuple(result)
-
-        for _ in range(5):
-            try:
-                fields = await self.db.get_schema_data_by_id(schema_id=schema_id, chain=self.chain)
-                data = generate_data(fields)
-
-                random_recipient = await self.get_random_address()
-
-                attestation = (
-                    int(schema_id, 16),  # schemaId
-                    0,  # linkedAttestationId
-                    0,  # attestTimestamp
-                    0,  # revokeTimestamp
-                    self.address,  # attester
-                    0,  # validUntil
-                    0,  # dataLocation
-                    False, # revoked
-                    [self.encode_string_to_bytes(random_recipient)], # recipients
-                    self.encode_tuple_to_bytes(data) #data
-                )
-
-                indexingKey = self.address
-                delegateSignature = '0x'
-                extraData = '0x'
-
-                # Строим необработанную транзакцию (без газа)
-                transaction = self.contract.functions.attest(attestation=attestation, indexingKey=indexingKey, delegateSignature=delegateSignature, extraData=extraData).build_transaction({
-                    'from': self.address,
-                    'nonce': self.w3.w3.eth.get_transaction_count(self.address),
-                    'chainId': chain_ids.get(self.chain),
-                    'gasPrice': self.w3.w3.to_wei(1, 'gwei') if self.chain=="bsc" else self.w3.w3.eth.gas_price
-                })
-
-                # Оцениваем газ
-                estimated_gas = self.w3.w3.eth.estimate_gas(transaction)
-
-                # Строим окончательную транзакцию с рассчитанным газом
-                transaction['gas'] = int(estimated_gas * 1.05)
-                signed_transaction = self.w3.w3.eth.account.sign_transaction(transaction, private_key=self.key)
-                tx_hash = self.w3.w3.eth.send_raw_transaction(signed_transaction.rawTransaction)
-                receipt = self.w3.w3.eth.wait_for_transaction_receipt(tx_hash)
-
-                if receipt.status == 1:
-                    explorer_url = explorers.get(self.chain)
-                    tx_link = f"{explorer_url}{tx_hash.hex()}"
-
-                    logger.success(f"Поток {self.thread} | Attestation created successfully: {tx_link} | Recipient: {random_recipient}")
-                    return True
-                else:
-                    raise Exception(f"Поток {self.thread} | Transaction failed with hash {tx_hash.hex()}")
-
-            except ValueError:
-                logger.warning(f"Поток {self.thread} | Тут нет денег на газ")
-                return False
+        # Адреса всех ключей посчитаны один раз на старте, здесь только случайный выбор
+        return get_address_book().random()
 
-            except Exception as err:
-                if err.args == ('execution reverted', 'no data'):
-                    logger.warning(f"Поток {self.thread} | Тут нет денег на газ")
-                    return False
-                else:
-                    logger.error(f"Поток {self.thread} | Failed attestation creation: {err}")
-                    await asyncio.sleep(15)
+    async def create_attestation(self, schema_id, fields, gate=None):
+        """
+        Отправляет транзакцию attest. Возвращает future подтверждения или False, если отправить не удалось.
+        """
+        async def attest():
+            recipient = await self.get_random_address()
+            tx_hash, estimate_key = await self.send_contract_transaction(
+                attest_calldata(self.ctx, self.fake, self.address, schema_id, fields, recipient), "attest",
+                shape=schema_shape(fields))
+            return tx_hash, estimate_key, recipient
+
+        try:
+            tx_hash, estimate_key, random_recipient = await call_with_retry(
+                attest, endpoint=f"rpc:{self.chain}", policy=TX_POLICY, classify=classify_tx_error,
+                label=f"Поток {self.thread}", gate=gate)
+        except Exception as err:
+            if is_no_gas(err):
+                logger.warning(f"Поток {self.thread} | Тут нет денег на газ")
+            else:
+                logger.error(f"Поток {self.thread} | Failed attestation creation: {err}")
+            return False
 
-        return False
+        await self.journal_sent(tx_hash, "attestations")
+        return self.track_transaction(
+            tx_hash, "Attestation created successfully", f" | Recipient: {random_recipient}",
+            estimate_key=estimate_key, mode="attestations")
 
     async def logout(self):
+        self.ctx.nonces.forget(self.address)
         await self.session.close()
 
 
+def generate_schema_data(fake) -> str:
+    field_types = ["string", "bool", "bytes", "uint256"]
 
-
+    data = {
+        "name": fake.word(),
+        "description": fake.sentence(nb_words=random.randint(5, 15)),
+        "data": [
+            {
+                "name": fake.word(),
+                "type": random.choice(field_types)
+            }
+            for _ in range(random.randint(1, 5))
+        ]
+    }
+    return json.dumps(data, ensure_ascii=False)
+
+
+def register_calldata(ctx, fake, address) -> bytes:
+    schema = (
+        address,  # registrant
+        True,  # revocable
+        0,  # dataLocation (пример, зависит от контракта)
+        0,  # maxValidFor (в секундах)
+        "0x0000000000000000000000000000000000000000",  # hook (если нет хука)
+        0,  # timestamp (текущее время)
+        generate_schema_data(fake)  # data
+    )
+    delegate_signature = b''
+    return ctx.register(schema, delegate_signature)
+
+
+def attestation_tuple(schema_id, address, recipient_bytes, data_bytes) -> tuple:
+    return (
+        int(schema_id, 16),  # schemaId
+        0,  # linkedAttestationId
+        0,  # attestTimestamp
+        0,  # revokeTimestamp
+        address,  # attester
+        0,  # validUntil
+        0,  # dataLocation
+        False, # revoked
+        [recipient_bytes], # recipients
+        data_bytes #data
+    )
+
+
+def attest_calldata(ctx, fake, address, schema_id, fields, recipient) -> bytes:
+    encoder = compile_schema(fields)
+    data = encoder.encode(encoder.values(fake))
+
+    indexing_key = address
+    delegate_signature = b''
+    extra_data = b''
+    return ctx.attest(
+        attestation_tuple(schema_id, address, encode_recipient(recipient), data), indexing_key, delegate_signature,
+        extra_data)
+
+
+def attest_calldata_many(ctx, fake, jobs) -> list:
+    """
+    jobs: [(address, schema_id, fields, recipient)] -> calldata в том же порядке.
+    data аттестаций одной схемы кодируются одной пачкой через encode_many.
+    """
+    groups = {}
+    for position, (_, _, fields, _) in enumerate(jobs):
+        groups.setdefault(compile_schema(fields), []).append(position)
+
+    data = [None] * len(jobs)
+    for encoder, positions in groups.items():
+        for position, encoded in zip(positions, encoder.encode_many([encoder.values(fake) for _ in positions])):
+            data[position] = encoded
+
+    return [
+        ctx.attest(attestation_tuple(schema_id, address, encode_recipient(recipient), data_bytes), address, b'', b'')
+        for (address, schema_id, _, recipient), data_bytes in zip(jobs, data)
+    ]
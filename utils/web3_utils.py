@@ -1,11 +1,27 @@
 from eth_account import Account
+from eth_abi.abi import default_codec
 from eth_account.messages import encode_defunct, SignableMessage
-from web3 import Web3
+from eth_utils import function_signature_to_4byte_selector, to_checksum_address
+from web3 import AsyncWeb3
+
+from utils.endpoint_pool import EndpointPool, PoolProvider
+
+# balanceOf(address) ERC721 собирается вручную: контракт web3 с полным ABI на каждый вызов не нужен
+ERC721_BALANCE_OF = function_signature_to_4byte_selector("balanceOf(address)")
+_address_encoder = default_codec._registry.get_encoder("address")
+
+
+def erc721_balance_call(owner, contract_address) -> dict:
+    """Параметры eth_call для balanceOf(owner) - годятся и для w3.eth.call, и для batch-запроса"""
+    return {"to": to_checksum_address(contract_address),
+            "data": "0x" + (ERC721_BALANCE_OF + _address_encoder(owner)).hex()}
 
 
 class Web3Utils:
-    def __init__(self, http_provider: str = 'https://eth.llamarpc.com', mnemonic: str = None, key: str = None):
-        self.w3 = None
+    def __init__(self, http_provider: str = 'https://eth.llamarpc.com', mnemonic: str = None, key: str = None,
+                 w3: AsyncWeb3 = None, gas=None):
+        self.w3 = w3
+        self.gas = gas  # GasOracle сети, если есть - цена газа берётся из его кэша
         Account.enable_unaudited_hdwallet_features()
         if mnemonic:
             self.mnemonic = mnemonic
@@ -14,10 +30,16 @@ class Web3Utils:
             self.mnemonic = ""
             self.acct = Account.from_key(key)
 
-        self.new_provider(http_provider)
+        if self.w3 is None:
+            self.new_provider(http_provider)
 
-    def new_provider(self, http_provider: str):
-        self.w3 = Web3(Web3.HTTPProvider(http_provider))
+    def new_provider(self, http_provider):
+        # Асинхронный провайдер: сетевые запросы не блокируют event loop, потоки реально работают параллельно.
+        # Список RPC - пул нод с выбором самой быстрой
+        if isinstance(http_provider, (list, tuple)):
+            self.w3 = AsyncWeb3(PoolProvider(EndpointPool(http_provider)))
+        else:
+            self.w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(http_provider))
 
     def create_wallet(self):
         self.acct, self.mnemonic = Account.create_with_mnemonic()
@@ -32,31 +54,43 @@ class Web3Utils:
     #def get_signed_code_struct(self, msg) -> str:
     #    return self.sign(encode_structured_data(msg)).signature.hex()
 
-    def wait_transaction(self, transaction_hash, timeout=240):
-        return self.w3.eth.wait_for_transaction_receipt(transaction_hash, timeout=timeout)
+    async def get_fees(self, gas_price=None) -> dict:
+        if gas_price:
+            return {'gasPrice': self.w3.to_wei(gas_price, 'gwei')}
+        if self.gas is not None:
+            return await self.gas.fees()
+        # gas_price из ноды уже в wei
+        return {'gasPrice': await self.w3.eth.gas_price}
 
-    def send_data_tx(self, to, from_, data, gas_price=None, gas_limit=None, nonce=None, chain_id=None):
+    def sign_transaction(self, transaction):
+        return self.w3.eth.account.sign_transaction(transaction, private_key=self.acct.key)
+
+    async def send_raw_transaction(self, raw_transaction):
+        return await self.w3.eth.send_raw_transaction(raw_transaction)
+
+    async def wait_transaction(self, transaction_hash, timeout=240):
+        return await self.w3.eth.wait_for_transaction_receipt(transaction_hash, timeout=timeout)
+
+    async def send_data_tx(self, to, from_, data, gas_price=None, gas_limit=None, nonce=None, chain_id=None):
         transaction = {
             'to': to,
             'from': from_,
             'data': data,
-            'gasPrice': self.w3.to_wei(gas_price, 'gwei') or self.w3.to_wei(self.w3.eth.gas_price, 'gwei'),
-            'gas': self.w3.eth.estimate_gas({'to': to, 'data': data}),
-            'nonce': nonce or self.w3.eth.get_transaction_count(self.acct.address),
-            'chainId': chain_id or self.w3.eth.chain_id
+            **await self.get_fees(gas_price),
+            'gas': await self.w3.eth.estimate_gas({'to': to, 'data': data}),
+            'nonce': nonce or await self.w3.eth.get_transaction_count(self.acct.address),
+            'chainId': chain_id or await self.w3.eth.chain_id
         }
 
         signed_transaction = self.w3.eth.account.sign_transaction(transaction, self.acct.key.hex())
         try:
-            transaction_hash = self.w3.eth.send_raw_transaction(signed_transaction.rawTransaction)
-            tx_hash = self.wait_transaction(transaction_hash)
+            transaction_hash = await self.w3.eth.send_raw_transaction(signed_transaction.rawTransaction)
+            tx_hash = await self.wait_transaction(transaction_hash)
 
             return True, tx_hash['transactionHash'].hex()
         except Exception as e:
             return None, e
 
-    def balance_of_erc721(self, address, contract_address):
-        abi = '[{"anonymous":false,"inputs":[{"indexed":true,"internalType":"address","name":"owner","type":"address"},{"indexed":true,"internalType":"address","name":"approved","type":"address"},{"indexed":true,"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"Approval","type":"event"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"address","name":"owner","type":"address"},{"indexed":true,"internalType":"address","name":"operator","type":"address"},{"indexed":false,"internalType":"bool","name":"approved","type":"bool"}],"name":"ApprovalForAll","type":"event"},{"anonymous":false,"inputs":[{"indexed":true,"internalType":"address","name":"from","type":"address"},{"indexed":true,"internalType":"address","name":"to","type":"address"},{"indexed":true,"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"Transfer","type":"event"},{"inputs":[{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"approve","outputs":[],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"owner","type":"address"}],"name":"balanceOf","outputs":[{"internalType":"uint256","name":"balance","type":"uint256"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"getApproved","outputs":[{"internalType":"address","name":"operator","type":"address"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"address","name":"owner","type":"address"},{"internalType":"address","name":"operator","type":"address"}],"name":"isApprovedForAll","outputs":[{"internalType":"bool","name":"","type":"bool"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"name","outputs":[{"internalType":"string","name":"","type":"string"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"ownerOf","outputs":[{"internalType":"address","name":"owner","type":"address"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"address","name":"from","type":"address"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"safeTransferFrom","outputs":[],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"from","type":"address"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"tokenId","type":"uint256"},{"internalType":"bytes","name":"data","type":"bytes"}],"name":"safeTransferFrom","outputs":[],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"address","name":"operator","type":"address"},{"internalType":"bool","name":"_approved","type":"bool"}],"name":"setApprovalForAll","outputs":[],"stateMutability":"nonpayable","type":"function"},{"inputs":[{"internalType":"bytes4","name":"interfaceId","type":"bytes4"}],"name":"supportsInterface","outputs":[{"internalType":"bool","name":"","type":"bool"}],"stateMutability":"view","type":"function"},{"inputs":[],"name":"symbol","outputs":[{"internalType":"string","name":"","type":"string"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"tokenURI","outputs":[{"internalType":"string","name":"","type":"string"}],"stateMutability":"view","type":"function"},{"inputs":[{"internalType":"address","name":"from","type":"address"},{"internalType":"address","name":"to","type":"address"},{"internalType":"uint256","name":"tokenId","type":"uint256"}],"name":"transferFrom","outputs":[],"stateMutability":"nonpayable","type":"function"}]'
-
-        contract = self.w3.eth.contract(address=self.w3.to_checksum_address(contract_address), abi=abi)
-        return contract.functions.balanceOf(address).call()
\ No newline at end of file
+    async def balance_of_erc721(self, address, contract_address):
+        result = await self.w3.eth.call(erc721_balance_call(address, contract_address))
+        return int.from_bytes(result, "big")